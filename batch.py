@@ -0,0 +1,115 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+import configparser
+import os
+import shutil
+import sys
+
+import deck
+import make_ppt
+import price_cache
+import render
+
+# Every deck is built inside its own working directory so that the relative
+# temp/ and {ticker}/ trees used by make_ppt never collide between workers
+batch_dir = "batch/"
+output_dir = "decks/"
+
+
+def read_batch_file(file_path):
+    cfg = configparser.ConfigParser()
+    cfg.read(file_path)
+
+    # One section per deck, e.g. [AAPL], with the same keys as [settings]
+    # in config.ini. Values in [DEFAULT] are shared by every section.
+    batch = []
+    for section in cfg.sections():
+        settings = dict(cfg[section])
+        settings.setdefault("ticker", section)
+        batch.append(settings)
+    return batch
+
+
+def build_one(settings, template_file, out_dir, render_workers, work_root):
+    # work_root is absolute, a reused worker is still in the last deck's
+    # directory
+    render.workers = render_workers
+    work_dir = os.path.join(work_root, settings["ticker"])
+    os.makedirs(work_dir, exist_ok=True)
+    os.chdir(work_dir)
+
+    deck = make_ppt.build_deck(settings, template_file)
+
+    dst = os.path.join(out_dir, os.path.basename(deck))
+    shutil.move(deck, dst)
+    return dst
+
+
+def run_batch(batch, template_file="Template2.pptx", workers=None):
+    # Paths from the config are relative to where the batch was started,
+    # the workers are not
+    template_file = os.path.abspath(template_file)
+    out_dir = os.path.abspath(output_dir)
+    work_root = os.path.abspath(batch_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    for settings in batch:
+        if "logo" in settings:
+            settings["logo"] = os.path.abspath(settings["logo"])
+
+    # Parse the template before the pool starts, forked workers share it
+    deck.load_template(template_file)
+
+    # Pull the price history for the whole list in a few grouped requests up
+    # front, the workers then only read their slice from the cache
+    today_date = datetime.now().date()
+    five_years = (datetime.now() - timedelta(days=365 * 5)).date()
+    try:
+        price_cache.prefetch(
+            [settings["ticker"] for settings in batch], five_years, today_date
+        )
+    except Exception as e:
+        print(f"Bulk price download failed, workers will fetch their own: {e}")
+
+    # Share the cores between the deck workers and their chart renderers
+    workers = workers or os.cpu_count()
+    render_workers = max(1, os.cpu_count() // workers)
+
+    built = {}
+    failed = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(
+                build_one, settings, template_file, out_dir, render_workers, work_root
+            ): settings["ticker"]
+            for settings in batch
+        }
+        for future in as_completed(futures):
+            ticker_symbol = futures[future]
+            try:
+                built[ticker_symbol] = future.result()
+                print(f"{ticker_symbol}: {built[ticker_symbol]}")
+            except Exception as e:
+                failed[ticker_symbol] = e
+                print(f"{ticker_symbol}: failed - {e}")
+
+    return built, failed
+
+
+def usage():
+    print("\nUsage:\npython3 batch.py batch.ini [workers]")
+    exit(0)
+
+
+def main():
+    if len(sys.argv) < 2:
+        usage()
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    batch = read_batch_file(sys.argv[1])
+    _, failed = run_batch(batch, workers=workers)
+    if failed:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import argparse
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from deck import Template
+import indicators
+import make_ppt
+import render
+import render_cache
+import yf_charts
+
+# Benchmarks for the deck pipeline on synthetic data, no network or browser
+# needed. Each step is timed on its own (best of --repeat runs) and can be
+# compared with a saved baseline:
+#   python3 bench.py --save            write bench_baseline.json
+#   python3 bench.py                   fail if a step got slower than that
+baseline_file = "bench_baseline.json"
+tolerance = 0.5  # allowed slowdown before a step counts as a regression
+noise_floor = 0.005  # seconds, smaller differences are timer and scheduler noise
+
+
+def synthetic_prices(days, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, days)))
+    open_ = close * (1 + rng.normal(0, 0.005, days))
+    return pd.DataFrame(
+        {
+            "Open": open_,
+            "High": np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, days)),
+            "Low": np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, days)),
+            "Close": close,
+            "Volume": rng.integers(1_000_000, 50_000_000, days),
+        },
+        index=pd.bdate_range(end=datetime.now().date(), periods=days),
+    )
+
+
+def synthetic_fundamentals(seed=0):
+    # Same attribute names and shapes as fundamentals.prefetch returns
+    rng = np.random.default_rng(seed)
+    now = pd.Timestamp(datetime.now().date())
+
+    quarters = pd.DatetimeIndex(
+        [now + pd.DateOffset(months=3 - 3 * i) for i in range(12)]
+    )
+    estimate = rng.uniform(0.5, 2.0, 12).round(2)
+    reported = (estimate * (1 + rng.normal(0, 0.1, 12))).round(2)
+    reported[0] = np.nan
+    earnings_dates = pd.DataFrame(
+        {
+            "EPS Estimate": estimate,
+            "Reported EPS": reported,
+            "Surprise(%)": ((reported - estimate) / estimate * 100).round(2),
+        },
+        index=quarters,
+    )
+
+    recommendations = pd.DataFrame(
+        {
+            "period": ["0m", "-1m", "-2m", "-3m"],
+            "strongBuy": rng.integers(0, 15, 4),
+            "buy": rng.integers(0, 25, 4),
+            "hold": rng.integers(0, 15, 4),
+            "sell": rng.integers(0, 5, 4),
+            "strongSell": rng.integers(0, 3, 4),
+        }
+    )
+
+    grades = ["Buy", "Hold", "Sell", "Outperform", "Underweight", "Neutral"]
+    upgrades_downgrades = pd.DataFrame(
+        {
+            "Firm": [f"Firm {i}" for i in range(40)],
+            "ToGrade": rng.choice(grades, 40),
+            "FromGrade": rng.choice(grades, 40),
+            "Action": rng.choice(["up", "down", "main", "init"], 40),
+        },
+        index=pd.DatetimeIndex([now - timedelta(days=7 * i) for i in range(40)]),
+    )
+
+    insider_transactions = pd.DataFrame(
+        {
+            "Start Date": [now - timedelta(days=3 * i) for i in range(120)],
+            "Shares": rng.integers(100, 500_000, 120),
+        }
+    )
+
+    stamp = int(time.time())
+    news = [
+        {
+            "title": f"Headline number {i} & more",
+            "publisher": f"Publisher {i}",
+            "providerPublishTime": stamp - 3600 * i,
+        }
+        for i in range(8)
+    ]
+    return SimpleNamespace(
+        earnings_dates=earnings_dates,
+        recommendations=recommendations,
+        upgrades_downgrades=upgrades_downgrades,
+        insider_transactions=insider_transactions,
+        news=news,
+    )
+
+
+def synthetic_template(filename):
+    # A small pptx with the placeholders, tagged pictures and notes that
+    # make_ppt looks for
+    ns = (
+        'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships" '
+        'xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main"'
+    )
+    rel_type = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+    slides = {
+        1: ["Company", "Date"],
+        3: ["Tagline"],
+        7: [f"Headline{i}" for i in range(1, 9)],
+        10: ["Next_EPS"],
+    }
+    pictures = list(make_ppt.image_map.items())
+    for i, (key, media) in enumerate(pictures):
+        slides.setdefault(11 + i // 3, [])
+
+    blank = io.BytesIO()
+    Image.new("RGB", (16, 9), "black").save(blank, format="PNG")
+
+    with zipfile.ZipFile(filename, "w", zipfile.ZIP_DEFLATED) as zout:
+        zout.writestr(
+            "[Content_Types].xml",
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="png" ContentType="image/png"/>'
+            '<Default Extension="xml" ContentType="application/xml"/></Types>',
+        )
+        zout.writestr("ppt/theme/theme1.xml", "<a:theme/>" * 5000)
+        for number, texts in slides.items():
+            shapes = "".join(
+                f"<p:sp><p:txBody><a:p><a:r><a:t>{text}</a:t></a:r></a:p></p:txBody></p:sp>"
+                for text in texts
+            )
+            rels = f'<Relationship Id="rId1" Type="{rel_type}/notesSlide" Target="../notesSlides/notesSlide{number}.xml"/>'
+            for i, (key, media) in enumerate(pictures):
+                if 11 + i // 3 != number:
+                    continue
+                shapes += (
+                    f'<p:pic><p:nvPicPr><p:cNvPr id="{i + 2}" name="Picture {i}" descr="{key}"/>'
+                    f'</p:nvPicPr><p:blipFill><a:blip r:embed="rId{i + 2}"/></p:blipFill>'
+                    '<p:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="5486400" cy="3086100"/>'
+                    "</a:xfrm></p:spPr></p:pic>"
+                )
+                rels += f'<Relationship Id="rId{i + 2}" Type="{rel_type}/image" Target="../media/{media}"/>'
+            zout.writestr(
+                f"ppt/slides/slide{number}.xml",
+                f"<p:sld {ns}><p:cSld><p:spTree>{shapes}</p:spTree></p:cSld></p:sld>",
+            )
+            zout.writestr(
+                f"ppt/slides/_rels/slide{number}.xml.rels",
+                '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                f"{rels}</Relationships>",
+            )
+            zout.writestr(
+                f"ppt/notesSlides/notesSlide{number}.xml",
+                f"<p:notes {ns}><p:cSld><p:spTree><p:sp><p:txBody><a:p><a:r>"
+                "<a:t>_narration_</a:t></a:r></a:p></p:txBody></p:sp></p:spTree>"
+                "</p:cSld></p:notes>",
+            )
+        for key, media in pictures:
+            zout.writestr(f"ppt/media/{media}", blank.getvalue())
+
+
+def best_of(fn, repeat):
+    # one untimed call first for imports, caches and lazily built state
+    fn()
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+        # a chart function queues its figure, drop it so nothing piles up
+        render.jobs.clear()
+        render.keys.clear()
+    return min(times)
+
+
+def run(tickers=20, lengths=(250, 1250), repeat=5, export=False):
+    results = {}
+    ticker_symbol = "BENCH"
+    os.makedirs(ticker_symbol, exist_ok=True)
+
+    for days in lengths:
+        data = synthetic_prices(days)
+        close = data["Close"].to_numpy(dtype=float)
+        results[f"indicators.compute[{days}]"] = best_of(
+            lambda: indicators.compute(close), repeat
+        )
+
+        frames = {f"T{i}": synthetic_prices(days, seed=i) for i in range(tickers)}
+        results[f"indicators.compute_frames[{tickers}x{days}]"] = best_of(
+            lambda: indicators.compute_frames(frames), repeat
+        )
+
+        state = indicators.build_state(close)
+        series = indicators.compute(close)
+        results[f"indicators.extend[{days}+1]"] = best_of(
+            lambda: indicators.extend(series, state, close[-1:]), repeat
+        )
+
+        five_year = yf_charts.chart_window(data, series)
+        ninety = yf_charts.chart_window(data, series, 90)
+        year = yf_charts.chart_window(data, series, 365)
+        results[f"chart_window[{days}]"] = best_of(
+            lambda: yf_charts.chart_window(data, series, 90), repeat
+        )
+        charts = {
+            "candle 5 Year": lambda: yf_charts.candle(
+                ticker_symbol, "5 Year", five_year
+            ),
+            "candle 90 Day": lambda: yf_charts.candle(ticker_symbol, "90 Day", ninety),
+            "moving_averages": lambda: yf_charts.moving_averages(
+                ticker_symbol, 365, year
+            ),
+            "rsi": lambda: yf_charts.rsi(ticker_symbol, 90, ninety),
+            "macd": lambda: yf_charts.macd(ticker_symbol, 90, ninety),
+            "bollinger_candle": lambda: yf_charts.bollinger_candle(
+                ticker_symbol, 90, ninety
+            ),
+        }
+        for name, chart in charts.items():
+            results[f"{name}[{days}]"] = best_of(chart, repeat)
+
+        if export:
+
+            def export_all():
+                for chart in charts.values():
+                    chart()
+                render.render_all()
+
+            results[f"render_all[{days}]"] = best_of(export_all, repeat)
+
+    stock = synthetic_fundamentals()
+    tables = {
+        "earnings": yf_charts.earnings,
+        "recommendations": yf_charts.recommendations,
+        "up_downgrades": yf_charts.up_downgrades,
+        "insider": yf_charts.insider,
+        "news": yf_charts.news,
+    }
+    for name, table in tables.items():
+        results[name] = best_of(lambda: table(ticker_symbol, stock), repeat)
+
+    # template fill and zip, with the charts in place
+    template_file = "BenchTemplate.pptx"
+    synthetic_template(template_file)
+    for key in make_ppt.image_map:
+        Image.new("RGB", (640, 360), "black").save(f"{ticker_symbol}/{key}.png")
+    make_ppt.config = {"tagline": "Benchmarks & more", "logo": ""}
+
+    results["template.parse"] = best_of(
+        lambda: Template(os.path.abspath(template_file)), repeat
+    )
+
+    def fill():
+        make_ppt.open_template(template_file, ticker_symbol)
+        make_ppt.title("Bench", ticker_symbol)
+        make_ppt.overview("Bench", ticker_symbol)
+        make_ppt.headlines("Bench", ticker_symbol)
+        make_ppt.eps("Bench", ticker_symbol)
+        make_ppt.replace_images("Bench", ticker_symbol)
+
+    results["template fill"] = best_of(fill, repeat)
+    fill()
+    results["zip_ppt"] = best_of(lambda: make_ppt.deck.save(io.BytesIO()), repeat)
+    return results
+
+
+def compare(results, baseline, allowed=tolerance):
+    regressions = []
+    print(f"{'step':<40} {'now':>9} {'baseline':>9} {'change':>8}")
+    for name, seconds in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<40} {seconds * 1000:>7.2f}ms {'-':>9}")
+            continue
+        change = seconds / before - 1 if before else 0.0
+        flag = ""
+        if change > allowed and seconds - before > noise_floor:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(
+            f"{name:<40} {seconds * 1000:>7.2f}ms {before * 1000:>7.2f}ms {change:>+7.0%}{flag}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickers", type=int, default=20)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[250, 1250])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--render", action="store_true", help="also export PNGs")
+    parser.add_argument("--save", action="store_true", help="save as the baseline")
+    parser.add_argument("--baseline", default=baseline_file)
+    parser.add_argument("--tolerance", type=float, default=tolerance)
+    args = parser.parse_args()
+    baseline_path = os.path.abspath(args.baseline)
+
+    # work in a scratch directory with a cache that never hits
+    cwd = os.getcwd()
+    work = tempfile.mkdtemp(prefix="bench")
+    render_cache.cache_dir = os.path.join(work, "renders/")
+    render_cache.max_bytes = 0
+    os.chdir(work)
+    try:
+        results = run(args.tickers, args.lengths, args.repeat, args.render)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work, ignore_errors=True)
+
+    if args.save:
+        with open(baseline_path, "w") as file:
+            json.dump(results, file, indent=1)
+        print(f"Saved {len(results)} timings to {baseline_path}")
+        return
+
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as file:
+            baseline = json.load(file)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} step(s) slower than the baseline")
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+# Charts are exported at a fixed size, so a series never needs more points
+# than the image is pixels wide. Long windows are thinned before they go to
+# Plotly: candles are merged into weekly, monthly, ... bars until they fit,
+# line series are reduced with Largest-Triangle-Three-Buckets, which keeps
+# the peaks and troughs a plain stride would drop. Windows that already fit
+# are passed through untouched, so the short charts look as they did.
+
+plot_width = 700  # pixels, Plotly's default export width
+margins = 160  # Plotly's default left and right margins, no data there
+pixels_per_bar = 2  # a candle needs a body and a gap to stay readable
+pixels_per_point = 2
+
+
+def week(x):
+    return (x - pd.to_timedelta(x.dayofweek, unit="D")).normalize().asi8
+
+
+def month(x):
+    return np.asarray(x.year * 12 + x.month)
+
+
+def quarter(x):
+    return np.asarray(x.year * 4 + x.quarter)
+
+
+def year(x):
+    return np.asarray(x.year)
+
+
+# coarsest last, the first one that fits is used
+periods = [week, month, quarter, year]
+
+
+def plot_area(width=None):
+    return max((width or plot_width) - margins, 1)
+
+
+def max_bars(width=None):
+    return max(plot_area(width) // pixels_per_bar, 1)
+
+
+def max_points(width=None):
+    return max(plot_area(width) // pixels_per_point, 3)
+
+
+def bars(window, limit=None):
+    # A chart_window with at most limit bars, resampled to the shortest
+    # period that gets there
+    limit = limit or max_bars()
+    if len(window.close) <= limit:
+        return window
+    for period in periods:
+        keys = period(window.x)
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        if len(starts) <= limit:
+            break
+    return resample(window, starts)
+
+
+def resample(window, starts):
+    # One bar per run of days starting at each index in starts: first open,
+    # highest high, lowest low, last close and the total volume, with the
+    # indicators as of the last day
+    ends = np.r_[starts[1:], len(window.close)] - 1
+    return SimpleNamespace(
+        x=window.x[starts],
+        open=window.open[starts],
+        high=np.maximum.reduceat(window.high, starts),
+        low=np.minimum.reduceat(window.low, starts),
+        close=window.close[ends],
+        volume=np.add.reduceat(window.volume, starts),
+        prev_close=window.prev_close,
+        series={name: values[ends] for name, values in window.series.items()},
+    )
+
+
+def lttb(y, threshold):
+    # Indices of the threshold points of y (evenly spaced x) that keep its
+    # shape: the first and last point, and from each bucket in between the
+    # one forming the largest triangle with the point kept before it and
+    # the average of the next bucket
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.arange(n, dtype=float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    keep = np.empty(threshold, dtype=int)
+    keep[0] = 0
+    keep[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[end : edges[i + 2]].mean()
+            next_y = y[end : edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs(
+            (x[a] - next_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (next_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def line(x, y, limit=None):
+    # (x, y) of one line trace with at most limit points. Missing values
+    # (the warm-up of a long moving average) aren't drawn anyway.
+    limit = limit or max_points()
+    if len(y) <= limit:
+        return x, y
+    present = np.flatnonzero(~np.isnan(y))
+    kept = present[lttb(y[present], limit)]
+    return x[kept], y[kept]
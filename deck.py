@@ -0,0 +1,327 @@
+from types import SimpleNamespace
+import xml.etree.ElementTree as ET
+import copy
+import io
+import os
+import posixpath
+import re
+import struct
+import threading
+import zipfile
+
+import placeholders
+import profiling
+
+# The template is read into memory once and the edited parts are kept as
+# bytes, nothing is extracted to disk. On save, members that were never
+# touched (theme, layouts, masters, ...) are copied with their compressed
+# bytes as they are, only the edited ones get compressed again.
+
+# PNG, JPEG and friends are compressed already
+stored_suffixes = (".png", ".jpg", ".jpeg", ".gif", ".emf", ".wmf")
+
+# slide and notes XML is parsed up front, everything else read on demand
+parsed_parts = re.compile(r"ppt/(slides|notesSlides)/[^/]+\.xml$")
+
+p_ns = "{http://schemas.openxmlformats.org/presentationml/2006/main}"
+a_ns = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+r_ns = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+rels_ns = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+content_types = "[Content_Types].xml"
+image_rel = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/image"
+
+# PowerPoint 2016 and later draw an SVG picture from this blip extension,
+# older viewers keep showing the PNG the blip itself embeds
+svg_blip_uri = "{96DAC541-7B7A-43D3-8B79-37D633B846F1}"
+svg_ns = "http://schemas.microsoft.com/office/drawing/2016/SVG/main"
+
+
+def slide_number(part):
+    return int(re.search(r"(\d+)\.xml$", part).group(1))
+
+
+def rels_part(part):
+    folder, name = posixpath.split(part)
+    return f"{folder}/_rels/{name}.rels"
+
+
+def add_svg_blip(xml, png_rel, svg_rel):
+    # The picture's <a:blip r:embed="png_rel"> gets an svgBlip extension.
+    # extLst is the blip's last child, an existing one is added to.
+    blip = re.search(rf'<a:blip\b[^>]*\br:embed="{png_rel}"[^>]*?(/?)>', xml)
+    if blip is None:
+        raise KeyError(png_rel)
+    ext = (
+        f'<a:ext uri="{svg_blip_uri}">'
+        f'<asvg:svgBlip xmlns:asvg="{svg_ns}" r:embed="{svg_rel}"/></a:ext>'
+    )
+    if blip.group(1):
+        opening = blip.group(0)[:-2].rstrip() + ">"
+        return (
+            xml[: blip.start()]
+            + f"{opening}<a:extLst>{ext}</a:extLst></a:blip>"
+            + xml[blip.end() :]
+        )
+
+    end = xml.index("</a:blip>", blip.end())
+    inner = xml[blip.end() : end]
+    if svg_blip_uri in inner:
+        return xml
+    if "</a:extLst>" in inner:
+        at = blip.end() + inner.rindex("</a:extLst>")
+    else:
+        at = end
+        ext = f"<a:extLst>{ext}</a:extLst>"
+    return xml[:at] + ext + xml[at:]
+
+
+def add_default_type(xml, extension, content_type):
+    if re.search(rf'<Default Extension="{extension}"', xml, re.IGNORECASE):
+        return xml
+    default = f'<Default Extension="{extension}" ContentType="{content_type}"/>'
+    return xml.replace("</Types>", default + "</Types>")
+
+
+class Template:
+    # Everything about the template that doesn't change between decks. It is
+    # never modified after loading, so threads and forked workers can share
+    # one copy.
+    def __init__(self, template_file):
+        self.path = template_file
+        self.mtime = os.path.getmtime(template_file)
+        with profiling.span("template.parse"):
+            self.load(template_file)
+
+    def load(self, template_file):
+        with open(template_file, "rb") as file:
+            self.source = file.read()
+        self.zip = zipfile.ZipFile(io.BytesIO(self.source))
+        self.infos = self.zip.infolist()
+        self.lock = threading.Lock()
+
+        # slide XML and where its placeholders are, see placeholders.parse
+        self.parts = {}
+        self.placeholders = {}
+        for info in self.infos:
+            if not parsed_parts.match(info.filename):
+                continue
+            content = self.zip.read(info).decode("utf-8")
+            self.parts[info.filename] = content
+            parsed = placeholders.parse(content)
+            if parsed is not None:
+                self.placeholders[info.filename] = parsed
+
+        self.index()
+
+    def index(self):
+        # Where things are, found from the template itself so a reshuffled
+        # template needs no remapping:
+        #   slide_for[placeholder] -> first slide that contains it
+        #   notes_for[slide] -> its notesSlide part
+        #   images[alt text or shape name] -> the picture and its media part
+        #   media_slots[media part] -> the first picture showing it, for
+        #       templates whose pictures aren't tagged
+        self.slide_for = {}
+        self.notes_for = {}
+        self.images = {}
+        self.media_slots = {}
+        slides = [p for p in self.parts if p.startswith("ppt/slides/")]
+        for part in sorted(slides, key=slide_number):
+            for token in self.placeholders.get(part, ([], []))[1]:
+                self.slide_for.setdefault(token, part)
+
+            rels = self.relationships(part)
+            for rel_type, target in rels.values():
+                if rel_type.endswith("/notesSlide"):
+                    self.notes_for[part] = target
+
+            root = ET.fromstring(self.parts[part])
+            for pic in root.iter(p_ns + "pic"):
+                shape = pic.find(f"{p_ns}nvPicPr/{p_ns}cNvPr")
+                blip = pic.find(f".//{a_ns}blip")
+                if shape is None or blip is None:
+                    continue
+                rel = blip.get(r_ns + "embed")
+                if rel not in rels:
+                    continue
+                extent = pic.find(f"{p_ns}spPr/{a_ns}xfrm/{a_ns}ext")
+                slot = SimpleNamespace(
+                    part=part,
+                    rel=rel,
+                    media=rels[rel][1],
+                    cx=int(extent.get("cx")) if extent is not None else None,
+                    cy=int(extent.get("cy")) if extent is not None else None,
+                )
+                for key in (shape.get("descr"), shape.get("name")):
+                    if key:
+                        self.images.setdefault(key, slot)
+                self.media_slots.setdefault(slot.media, slot)
+
+    def relationships(self, part):
+        # {rId: (type, target part)} from the part's .rels file
+        folder = posixpath.dirname(part)
+        try:
+            root = ET.fromstring(self.read(rels_part(part)))
+        except KeyError:
+            return {}
+        rels = {}
+        for rel in root.iter(rels_ns + "Relationship"):
+            target = posixpath.normpath(posixpath.join(folder, rel.get("Target")))
+            rels[rel.get("Id")] = (rel.get("Type"), target)
+        return rels
+
+    def read(self, name):
+        # the shared zip handle seeks, one reader at a time
+        with self.lock:
+            return self.zip.read(name)
+
+
+templates = {}
+templates_lock = threading.Lock()
+
+
+def load_template(template_file):
+    # One parsed Template per file and process, parsed again when the file
+    # on disk is newer than the cached copy
+    path = os.path.abspath(template_file)
+    mtime = os.path.getmtime(path)
+    with templates_lock:
+        template = templates.get(path)
+        if template is None or template.mtime != mtime:
+            template = Template(path)
+            templates[path] = template
+    return template
+
+
+class Deck:
+    def __init__(self, template):
+        if not isinstance(template, Template):
+            template = load_template(template)
+        self.template = template
+        self.source = template.source
+        self.infos = template.infos
+        self.changed = {}
+        # slides are edited from several pipeline stages at once, every
+        # read-modify-write of a part holds this
+        self.lock = threading.Lock()
+
+    def names(self):
+        return [info.filename for info in self.infos]
+
+    def read(self, name):
+        if name in self.changed:
+            return self.changed[name]
+        return self.template.read(name)
+
+    def read_text(self, name):
+        if name not in self.changed and name in self.template.parts:
+            return self.template.parts[name]
+        return self.read(name).decode("utf-8")
+
+    def fill(self, name, values):
+        # every placeholder of the part in one pass
+        with self.lock:
+            if name in self.changed:
+                parsed = placeholders.parse(self.read_text(name))
+            elif name in self.template.parts:
+                parsed = self.template.placeholders.get(name)
+            else:
+                raise KeyError(name)
+            if parsed is None:
+                print(f"No placeholders in '{name}'")
+                return
+            self.write(name, placeholders.fill(parsed, values, name))
+
+    def write_svg(self, slot, data):
+        # An SVG for one of the template's pictures (a Template.images slot),
+        # stored next to its PNG, which stays as the fallback image
+        media = posixpath.splitext(slot.media)[0] + ".svg"
+        with self.lock:
+            self.write(media, data)
+            rel = self.add_relationship(slot.part, image_rel, media)
+            xml = add_svg_blip(self.read_text(slot.part), slot.rel, rel)
+            self.write(slot.part, xml)
+            xml = add_default_type(
+                self.read_text(content_types), "svg", "image/svg+xml"
+            )
+            self.write(content_types, xml)
+
+    def add_relationship(self, part, rel_type, target):
+        # rId of the relationship from part to target, added if it's new
+        name = rels_part(part)
+        xml = self.read_text(name)
+        target = posixpath.relpath(target, posixpath.dirname(part))
+        existing = re.search(
+            rf'<Relationship\b[^>]*\bTarget="{re.escape(target)}"[^>]*>', xml
+        )
+        if existing is not None:
+            return re.search(r'\bId="([^"]+)"', existing.group(0)).group(1)
+
+        ids = set(re.findall(r'\bId="([^"]+)"', xml))
+        number = len(ids) + 1
+        while f"rId{number}" in ids:
+            number += 1
+        rel = f"rId{number}"
+        xml = xml.replace(
+            "</Relationships>",
+            f'<Relationship Id="{rel}" Type="{rel_type}" Target="{target}"/>'
+            "</Relationships>",
+        )
+        self.write(name, xml)
+        return rel
+
+    def write(self, name, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.changed[name] = data
+
+    def save(self, output):
+        # output is a path or any writable file object, e.g. a socket
+        # stream, the archive is written straight into it
+        files = [output] if isinstance(output, str) else []
+        with profiling.span("zip_ppt", files=files):
+            self.write_archive(output)
+
+    def write_archive(self, output):
+        with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as zout:
+            for info in self.infos:
+                if info.filename in self.changed:
+                    self.write_member(zout, info, self.changed[info.filename])
+                else:
+                    self.copy_raw(zout, info)
+
+            known = set(self.names())
+            for name, data in self.changed.items():
+                if name not in known:
+                    self.write_member(zout, zipfile.ZipInfo(name), data)
+
+    def write_member(self, zout, info, data):
+        zinfo = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+        if info.filename.lower().endswith(stored_suffixes):
+            zinfo.compress_type = zipfile.ZIP_STORED
+        else:
+            zinfo.compress_type = zipfile.ZIP_DEFLATED
+        zout.writestr(zinfo, data)
+
+    def copy_raw(self, zout, info):
+        # The compressed payload follows the member's local header in the
+        # template, so it can be written out again without inflating it
+        offset = info.header_offset
+        name_length, extra_length = struct.unpack(
+            "<HH", self.source[offset + 26 : offset + 30]
+        )
+        start = offset + 30 + name_length + extra_length
+        payload = memoryview(self.source)[start : start + info.compress_size]
+
+        zinfo = copy.copy(info)
+        zinfo.header_offset = zout.fp.tell()
+        # sizes and CRC are known up front, no trailing data descriptor
+        zinfo.flag_bits &= ~0x08
+        zout.fp.write(zinfo.FileHeader())
+        zout.fp.write(payload)
+
+        zout.filelist.append(zinfo)
+        zout.NameToInfo[zinfo.filename] = zinfo
+        zout.start_dir = zout.fp.tell()
+        zout._didModify = True
@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import time
+
+import profiling
+
+# Lazy yf.Ticker properties read by the table charts and the narration.
+# Each one is its own blocking request, so they are fetched side by side.
+attributes = [
+    "earnings_dates",
+    "recommendations",
+    "upgrades_downgrades",
+    "insider_transactions",
+    "news",
+]
+
+timeout = 10  # seconds for one attempt at an attribute
+retries = 2
+backoff = 0.5  # seconds, doubled after every failed attempt
+
+
+def request(yf_stock, name, attempt):
+    with profiling.span(f"fundamentals.{name}", attempt=attempt):
+        return getattr(yf_stock, name)
+
+
+def fetch_attribute(yf_stock, name, requests):
+    # Every attempt runs on the requests pool and gets timeout seconds. A
+    # hung one is left to finish in the background while the next one runs.
+    for attempt in range(retries + 1):
+        future = requests.submit(request, yf_stock, name, attempt)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            error = f"no answer in {timeout}s"
+            if attempt == retries:
+                raise TimeoutError(error)
+        except Exception as e:
+            error = e
+            if attempt == retries:
+                raise
+        print(f"Retrying {name}: {error}")
+        time.sleep(backoff * 2**attempt)
+
+
+def prefetch(yf_stock):
+    # Returns a namespace with the same attribute names as yf.Ticker so the
+    # chart functions read in-memory data. Attributes that fail or time out
+    # on every attempt are None.
+    requests = ThreadPoolExecutor(max_workers=len(attributes) * (retries + 1))
+    with ThreadPoolExecutor(max_workers=len(attributes)) as pool:
+        futures = {
+            name: pool.submit(fetch_attribute, yf_stock, name, requests)
+            for name in attributes
+        }
+    # don't block on hung requests, their threads finish in the background
+    requests.shutdown(wait=False)
+
+    values = {name: None for name in attributes}
+    for name, future in futures.items():
+        try:
+            values[name] = future.result()
+        except Exception as e:
+            print(f"Could not fetch {name}: {e}")
+
+    return SimpleNamespace(**values)
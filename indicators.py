@@ -0,0 +1,323 @@
+from collections import deque
+import math
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Every series the charts need, computed once per ticker over the full
+# history. Inputs are 1-D (one ticker) or 2-D (tickers x days) close prices
+# and all the math runs along the last axis, so a stack of tickers costs
+# about the same number of numpy calls as one.
+
+ma_windows = [20, 50, 200]
+bollinger_window = 20
+num_std_dev = 2
+rsi_period = 14
+macd_fast = 12
+macd_slow = 26
+macd_signal = 9
+
+
+def window_sums(values, window):
+    # the sum of every full window along the last axis
+    sums = np.cumsum(values, axis=-1)
+    out = sums[..., window - 1 :].copy()
+    out[..., 1:] -= sums[..., :-window]
+    return out
+
+
+def rolling_mean(values, window):
+    # NaN only where the window holds a missing close, like pandas
+    # .rolling(), instead of from the first missing close onwards
+    out = np.full(values.shape, np.nan)
+    if values.shape[-1] < window:
+        return out
+    missing = np.isnan(values)
+    sums = window_sums(np.where(missing, 0.0, values), window)
+    gaps = window_sums(missing.astype(np.int64), window)
+    out[..., window - 1 :] = np.where(gaps == 0, sums / window, np.nan)
+    return out
+
+
+def rolling_std(values, window):
+    # sample standard deviation, same as pandas .rolling().std()
+    out = np.full(values.shape, np.nan)
+    if values.shape[-1] < window:
+        return out
+    windows = sliding_window_view(values, window, axis=-1)
+    out[..., window - 1 :] = windows.std(axis=-1, ddof=1)
+    return out
+
+
+def ema(values, period, first=None):
+    # talib seeds the EMA with the simple average of the first `period`
+    # values and emits it on the last of them. `first` moves the seed window
+    # so it ends on that index instead, which is how MACD lines up its fast
+    # and slow averages.
+    out = np.full(values.shape, np.nan)
+    if first is None:
+        first = period - 1
+    if values.shape[-1] <= first:
+        return out
+
+    k = 2.0 / (period + 1)
+    prev = values[..., first - period + 1 : first + 1].mean(axis=-1)
+    out[..., first] = prev
+    for i in range(first + 1, values.shape[-1]):
+        prev = (values[..., i] - prev) * k + prev
+        out[..., i] = prev
+    return out
+
+
+def rsi(values, period=rsi_period):
+    # Wilder smoothing seeded with simple averages, matching talib.RSI
+    out = np.full(values.shape, np.nan)
+    if values.shape[-1] <= period:
+        return out
+
+    diff = np.diff(values, axis=-1)
+    gains = np.where(diff > 0, diff, 0.0)
+    losses = np.where(diff < 0, -diff, 0.0)
+
+    avg_gain = gains[..., :period].mean(axis=-1)
+    avg_loss = losses[..., :period].mean(axis=-1)
+    out[..., period] = rsi_value(avg_gain, avg_loss)
+    for i in range(period + 1, values.shape[-1]):
+        avg_gain = (avg_gain * (period - 1) + gains[..., i - 1]) / period
+        avg_loss = (avg_loss * (period - 1) + losses[..., i - 1]) / period
+        out[..., i] = rsi_value(avg_gain, avg_loss)
+    return out
+
+
+def rsi_value(avg_gain, avg_loss):
+    total = avg_gain + avg_loss
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(total != 0, 100.0 * avg_gain / total, 0.0)
+
+
+def macd(values, fast=macd_fast, slow=macd_slow, signal=macd_signal):
+    # Same alignment as talib.MACD: both averages start on the slow one's
+    # first value and nothing is emitted until the signal line exists
+    slow_ema = ema(values, slow)
+    fast_ema = ema(values, fast, first=slow - 1)
+    line = fast_ema - slow_ema
+
+    signal_line = np.full(values.shape, np.nan)
+    if values.shape[-1] > slow - 1:
+        signal_line[..., slow - 1 :] = ema(line[..., slow - 1 :], signal)
+    line[..., : slow + signal - 2] = np.nan
+    return line, signal_line, line - signal_line
+
+
+def compute(close):
+    close = np.asarray(close, dtype=float)
+    series = {}
+    for window in ma_windows:
+        series[f"ma{window}"] = rolling_mean(close, window)
+
+    std = rolling_std(close, bollinger_window)
+    ma = series[f"ma{bollinger_window}"]
+    series["upper"] = ma + std * num_std_dev
+    series["lower"] = ma - std * num_std_dev
+
+    series["rsi"] = rsi(close)
+    series["macd"], series["signal"], series["hist"] = macd(close)
+
+    # the charts only read these
+    for values in series.values():
+        values.setflags(write=False)
+    return series
+
+
+def compute_frames(frames):
+    # {ticker: frame} -> {ticker: {name: series}}. Histories of the same
+    # length, which is the normal case for a nightly universe, are stacked
+    # into one 2-D block.
+    by_length = {}
+    for ticker_symbol, data in frames.items():
+        by_length.setdefault(len(data), []).append(ticker_symbol)
+
+    results = {}
+    for tickers in by_length.values():
+        block = np.vstack([frames[t]["Close"].to_numpy(dtype=float) for t in tickers])
+        series = compute(block)
+        for row, ticker_symbol in enumerate(tickers):
+            results[ticker_symbol] = {
+                name: values[row] for name, values in series.items()
+            }
+    return results
+
+
+# Incremental versions of the same series. They hold just enough state to
+# take the next close in O(1) and give the same values as compute() on the
+# whole history, so they can be pickled with the cached prices and advanced
+# by the handful of new bars each run.
+
+
+class RollingWindow:
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.total = 0.0
+        self.squares = 0.0
+        self.missing = 0  # NaN closes in the window, left out of the sums
+        self.pushed = 0
+
+    def push(self, value):
+        self.values.append(value)
+        self.add(value, 1)
+        if len(self.values) > self.window:
+            self.add(self.values.popleft(), -1)
+
+        # re-add from scratch now and then so rounding can't drift,
+        # amortized this is still O(1) per value
+        self.pushed += 1
+        if self.pushed % self.window == 0:
+            present = [v for v in self.values if not math.isnan(v)]
+            self.total = math.fsum(present)
+            self.squares = math.fsum(v * v for v in present)
+
+    def add(self, value, sign):
+        if math.isnan(value):
+            self.missing += sign
+        else:
+            self.total += sign * value
+            self.squares += sign * value * value
+
+    def full(self):
+        # like rolling_mean, a window with a missing close has no value
+        return len(self.values) == self.window and not self.missing
+
+    def mean(self):
+        if not self.full():
+            return np.nan
+        return self.total / self.window
+
+    def std(self):
+        if not self.full():
+            return np.nan
+        n = self.window
+        var = (self.squares - self.total * self.total / n) / (n - 1)
+        return math.sqrt(max(var, 0.0))
+
+
+class EMAState:
+    def __init__(self, period, seed_length=None):
+        # seed_length > period delays the seed to mirror ema(first=...)
+        self.period = period
+        self.seed_length = seed_length or period
+        self.k = 2.0 / (period + 1)
+        self.seen = deque(maxlen=period)
+        self.count = 0
+        self.value = np.nan
+
+    def push(self, value):
+        self.count += 1
+        if self.count < self.seed_length:
+            self.seen.append(value)
+        elif self.count == self.seed_length:
+            self.seen.append(value)
+            self.value = sum(self.seen) / self.period
+            self.seen = None
+        else:
+            self.value = (value - self.value) * self.k + self.value
+        return self.value
+
+
+class RSIState:
+    def __init__(self, period=rsi_period):
+        self.period = period
+        self.prev = None
+        self.count = 0
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+        self.value = np.nan
+
+    def push(self, value):
+        if self.prev is None:
+            self.prev = value
+            return self.value
+        diff = value - self.prev
+        self.prev = value
+        gain = diff if diff > 0 else 0.0
+        loss = -diff if diff < 0 else 0.0
+
+        self.count += 1
+        n = self.period
+        if self.count < n:
+            self.avg_gain += gain
+            self.avg_loss += loss
+            return self.value
+        if self.count == n:
+            self.avg_gain = (self.avg_gain + gain) / n
+            self.avg_loss = (self.avg_loss + loss) / n
+        else:
+            self.avg_gain = (self.avg_gain * (n - 1) + gain) / n
+            self.avg_loss = (self.avg_loss * (n - 1) + loss) / n
+
+        total = self.avg_gain + self.avg_loss
+        self.value = 100.0 * self.avg_gain / total if total != 0 else 0.0
+        return self.value
+
+
+class MACDState:
+    def __init__(self, fast=macd_fast, slow=macd_slow, signal=macd_signal):
+        self.slow_ema = EMAState(slow)
+        # the fast average is seeded on the same bar as the slow one
+        self.fast_ema = EMAState(fast, seed_length=slow)
+        self.signal_ema = EMAState(signal)
+
+    def push(self, value):
+        slow = self.slow_ema.push(value)
+        fast = self.fast_ema.push(value)
+        if np.isnan(slow):
+            return np.nan, np.nan, np.nan
+        line = fast - slow
+        signal = self.signal_ema.push(line)
+        if np.isnan(signal):
+            return np.nan, np.nan, np.nan
+        return line, signal, line - signal
+
+
+class IndicatorState:
+    def __init__(self):
+        self.windows = {window: RollingWindow(window) for window in ma_windows}
+        self.rsi = RSIState()
+        self.macd = MACDState()
+        self.count = 0
+
+    def push(self, close):
+        # the values compute() would give for this bar
+        self.count += 1
+        latest = {}
+        for window, rolling in self.windows.items():
+            rolling.push(close)
+            latest[f"ma{window}"] = rolling.mean()
+
+        std = self.windows[bollinger_window].std()
+        ma = latest[f"ma{bollinger_window}"]
+        latest["upper"] = ma + std * num_std_dev
+        latest["lower"] = ma - std * num_std_dev
+
+        latest["rsi"] = self.rsi.push(close)
+        latest["macd"], latest["signal"], latest["hist"] = self.macd.push(close)
+        return latest
+
+
+def extend(series, state, closes):
+    # Advance state over the new closes and return series with them
+    # appended. The indicator math is O(1) per close.
+    rows = [state.push(float(close)) for close in closes]
+    extended = {}
+    for name, values in series.items():
+        new = np.array([row[name] for row in rows], dtype=float)
+        extended[name] = np.concatenate([values, new])
+        extended[name].setflags(write=False)
+    return extended
+
+
+def build_state(close):
+    state = IndicatorState()
+    for value in close:
+        state.push(float(value))
+    return state
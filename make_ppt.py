@@ -1,24 +1,37 @@
 from datetime import date, datetime, timedelta
 import xml.etree.ElementTree as ET
 from pdf2image import convert_from_path
+import argparse
 import configparser
 
 import os
 import shutil
-import zipfile
-from yf_charts import default_narration, get_charts, narration
+from deck import Deck
+from pipeline import Stage, run
+import pictures
+import profiling
+import yf_charts
+from yf_charts import (
+    default_narration,
+    draw_charts,
+    get_fundamentals,
+    get_prices,
+    narration,
+)
 from screen import get_url
 
 image_clips = []
 audio_clips = []
 starts = []
 config = {}
+deck = None  # the presentation being built, held in memory
 
-root_dir = "temp/ppt/"
-slide_dir = "temp/ppt/slides/"
-notes_dir = "temp/ppt/notesSlides/"
+# parts inside the pptx archive
+root_dir = "ppt/"
+slide_dir = "ppt/slides/"
+notes_dir = "ppt/notesSlides/"
+media = "ppt/media/"
 notes_mp4_folder = "temp/notes_mp4"
-media = "temp/ppt/media/"
 
 # "This is a review of {company} and its financial outlook using publicly available data, some AI interpretation of that data and random commentary."
 
@@ -31,8 +44,19 @@ page_map = {
     "EPS": "slide10",
 }
 
-# Whenever the Template.pptx gets updated, it seems that the image names
-# get shuffled so this mapping needs to be adjusted
+# The slide for a page is found by the placeholder on it, page_map is only
+# the fallback for templates where it can't be found
+page_placeholders = {
+    "title": "Company",
+    "overview": "Tagline",
+    "headlines": "Headline1",
+    "EPS": "Next_EPS",
+}
+
+# Pictures are found by their alt text (or shape name) in the template, so
+# tag each one with its key below. Whenever the Template.pptx gets updated
+# the image names get shuffled, this mapping is only used for pictures that
+# aren't tagged.
 image_map = {
     "logo": "image2.png",
     "recommendations": "image4.png",
@@ -49,12 +73,76 @@ image_map = {
     "365_ma": "image14.png",
 }
 
+# Pictures that aren't charts, they keep all their colors
+photos = {"logo", "homepage"}
+
+
+def slide_part(page):
+    part = deck.template.slide_for.get(page_placeholders.get(page))
+    return part or slide_dir + page_map[page] + ".xml"
+
+
+def notes_part(slide):
+    part = deck.template.notes_for.get(slide)
+    return part or notes_dir + os.path.basename(slide).replace("slide", "notesSlide")
+
+
+def image_slot(key):
+    # the template's picture for key, by its tag or else by its image_map
+    # media, None when neither is in the template
+    slot = deck.template.images.get(key)
+    if slot is None:
+        slot = deck.template.media_slots.get(media + image_map[key])
+    return slot
+
+
+def image_part(key):
+    slot = image_slot(key)
+    if slot is None:
+        print(f"No picture for '{key}' in the template, using image_map")
+        return media + image_map[key]
+    return slot.media
+
+
+def remove_charts(ticker_symbol):
+    # Charts left over from the last build of this ticker would otherwise
+    # go into the deck in place of one that is skipped this time
+    for key in image_map:
+        if key in photos:
+            continue
+        for ext in ("png", "svg"):
+            try:
+                os.remove(f"{ticker_symbol}/{key}.{ext}")
+            except FileNotFoundError:
+                pass
+
 
 def replace_images(company, ticker_symbol):
-    for key, value in image_map.items():
-        dst = media + value
-        src = f"{ticker_symbol}/{key}.png"
-        shutil.copy(src, dst)
+    pngs = {}
+    for key in image_map:
+        # Vector charts go next to the picture's PNG. They are rendered with
+        # a small PNG of their own, which replaces the template's as the
+        # fallback below. The logo and the screenshot are always PNGs.
+        svg = f"{ticker_symbol}/{key}.svg"
+        png = f"{ticker_symbol}/{key}.png"
+        slot = image_slot(key)
+        if yf_charts.image_format == "svg" and os.path.exists(svg):
+            if slot is not None:
+                with open(svg, "rb") as file:
+                    deck.write_svg(slot, file.read())
+            else:
+                print(f"No picture for '{key}' in the template, using its PNG")
+        if not os.path.exists(png):
+            # a chart skipped for missing data
+            print(f"No {key} picture for {ticker_symbol}, keeping the template's")
+            continue
+
+        # sized to the picture's extent in the template where it is known
+        cx, cy = (slot.cx, slot.cy) if slot is not None else (None, None)
+        pngs[key] = (png, cx, cy, key not in photos)
+
+    for key, data in pictures.fit_all(pngs).items():
+        deck.write(image_part(key), data)
 
 
 def clean_up():
@@ -68,147 +156,91 @@ def open_template(template_file, ticker_symbol):
     if not os.path.exists(notes_mp4_folder):
         os.makedirs(notes_mp4_folder)
 
-    # Uzip the input ppt file
-    with zipfile.ZipFile(template_file, "r") as zip_ref:
-        zip_ref.extractall("temp")
+    # The template is parsed once per process, the slides of this deck are
+    # edited in memory on top of it
+    global deck
+    deck = Deck(template_file)
+    return deck
 
 
-def zip_ppt(temp_folder, output_file):
-    with zipfile.ZipFile(output_file, "w") as zip_ref:
-        for foldername, subfolders, filenames in os.walk(temp_folder):
-            for filename in filenames:
-                file_path = os.path.join(foldername, filename)
-                arcname = os.path.relpath(file_path, temp_folder)
-                zip_ref.write(file_path, arcname)
+def zip_ppt(output_file):
+    # Unchanged parts are copied over still compressed
+    deck.save(output_file)
 
 
 def update_narration(slidename, str):
-    filename = notes_dir + slidename.replace("slide", "notesSlide") + ".xml"
+    filename = notes_part(slidename)
     try:
-        # Open the file in read mode
-        with open(filename, "r") as file:
-            # Read the content of the file
-            content = file.read()
-
         # Replace '_narration_' with the str
-        updated = content.replace("_narration_", str)
-
-        # Open the file in write mode to overwrite
-        with open(filename, "w") as file:
-            # Write the updated content back to the file
-            file.write(updated)
+        deck.fill(filename, {"_narration_": str})
 
-    except FileNotFoundError:
-        print(f"File '{filename}' not found.")
+    except KeyError:
+        print(f"Part '{filename}' not found.")
     except Exception as e:
         print(f"An error occurred: {e}")
 
 
 def title(company, ticker_symbol):
-    filename = slide_dir + page_map["title"] + ".xml"
+    filename = slide_part("title")
     try:
-        # Open the file in read mode
-        with open(filename, "r") as file:
-            # Read the content of the file
-            content = file.read()
-
-        # Replace 'Company' with company
-        updated = content.replace("Company", company)
-        # Replace the date
+        # Replace 'Company' with company and the date
         today = date.today().strftime("%m/%d/%Y")
-        updated = updated.replace("Date", today)
+        deck.fill(filename, {"Company": company, "Date": today})
 
-        # Open the file in write mode to overwrite
-        with open(filename, "w") as file:
-            # Write the updated content back to the file
-            file.write(updated)
-
-    except FileNotFoundError:
-        print(f"File '{filename}' not found.")
+    except KeyError:
+        print(f"Part '{filename}' not found.")
     except Exception as e:
         print(f"An error occurred: {e}")
 
     update_narration(
-        page_map["title"],
+        filename,
         f"This is a review of {company} and its financial outlook using publicly available data, some AI interpretation of that data and random commentary.",
     )
 
 
 def eps(company, ticker_symbol):
-    filename = slide_dir + page_map["EPS"] + ".xml"
+    filename = slide_part("EPS")
     try:
-        # Open the file in read mode
-        with open(filename, "r") as file:
-            # Read the content of the file
-            content = file.read()
-
-        # Replace Tagline
-        global config
-        updated = content.replace("Next_EPS", narration["next_EPS"])
+        # Replace Next_EPS, blank when there are no earnings dates
+        deck.fill(filename, {"Next_EPS": narration.get("next_EPS", "")})
 
-        # Open the file in write mode to overwrite
-        with open(filename, "w") as file:
-            # Write the updated content back to the file
-            file.write(updated)
-
-    except FileNotFoundError:
-        print(f"File '{filename}' not found.")
+    except KeyError:
+        print(f"Part '{filename}' not found.")
     except Exception as e:
         print(f"An error occurred: {e}")
-    update_narration(page_map["EPS"], narration["EPS"])
+    update_narration(filename, narration.get("EPS", ""))
 
 
 def overview(company, ticker_symbol):
-    filename = slide_dir + page_map["overview"] + ".xml"
+    filename = slide_part("overview")
     try:
-        # Open the file in read mode
-        with open(filename, "r") as file:
-            # Read the content of the file
-            content = file.read()
-
         # Replace Tagline
         global config
-        updated = content.replace("Tagline", config["tagline"])
-
-        # Open the file in write mode to overwrite
-        with open(filename, "w") as file:
-            # Write the updated content back to the file
-            file.write(updated)
+        deck.fill(filename, {"Tagline": config["tagline"]})
 
-    except FileNotFoundError:
-        print(f"File '{filename}' not found.")
+    except KeyError:
+        print(f"Part '{filename}' not found.")
     except Exception as e:
         print(f"An error occurred: {e}")
 
 
 def headlines(company, ticker_symbol):
     global narration
-    slidename = slide_dir + page_map["headlines"] + ".xml"
+    slidename = slide_part("headlines")
     try:
-        # Open the file in read mode
-        with open(slidename, "r") as file:
-            # Read the content of the file
-            content = file.read()
-
-        # Replace 'Company' with company
-        i = 0
-        while i < 8:
-            target = f"Headline{i+1}"
-            update = content.replace(target, narration[target])
-            content = update
-            i += 1
-
-        # Open the file in write mode to overwrite
-        with open(slidename, "w") as file:
-            # Write the updated content back to the file
-            file.write(content)
-
-    except FileNotFoundError:
-        print(f"File '{slidename}' not found.")
+        # All eight at once, blank when there were fewer news items
+        values = {}
+        for i in range(1, 9):
+            target = f"Headline{i}"
+            values[target] = narration.get(target, "")
+        deck.fill(slidename, values)
+
+    except KeyError:
+        print(f"Part '{slidename}' not found.")
     except Exception as e:
         print(f"An error occurred: {e}")
 
-    update_narration(page_map["headlines"], narration["Headlines"])
+    update_narration(slidename, narration.get("Headlines", ""))
 
 
 def get_logo(ticker_symbol):
@@ -227,7 +259,9 @@ def setup():
 
 
 def usage():
-    print("\nUsage:\npython3 make_ppt.py config")
+    print(
+        "\nUsage:\npython3 make_ppt.py [config] [--trace trace.json] [--profile out.prof]"
+    )
     exit(0)
 
 
@@ -245,39 +279,95 @@ def read_config_file(file_path):
         return {}
 
 
-def main():
+def build_deck(settings, template_file="Template2.pptx"):
     clean_up()
     setup()
 
     global config
-    config = read_config_file("config.ini")
+    config = settings
     company = config["company"]
     ticker_symbol = config["ticker"]
     url = config["url"]
+    yf_charts.image_format = config.get("format", "png")
 
-    os.makedirs(ticker_symbol, exist_ok=True)
+    # narration is shared with yf_charts and would otherwise carry over
+    # headlines from the previous deck built in this process, and so would
+    # the profiling spans
+    narration.clear()
+    profiling.clear()
 
-    get_logo(ticker_symbol)
+    os.makedirs(ticker_symbol, exist_ok=True)
+    remove_charts(ticker_symbol)
 
-    # Create the charts
     today_date = datetime.now().date()
     five_years = (datetime.now() - timedelta(days=365 * 5)).date()
+    output_file = f"{ticker_symbol}.pptx"
+    fetched = {}
+
+    def prices():
+        fetched["prices"] = get_prices(ticker_symbol, five_years, today_date)
+
+    def fundamentals():
+        fetched["fundamentals"] = get_fundamentals(ticker_symbol)
+
+    def charts():
+        stock_data, series = fetched["prices"]
+        draw_charts(ticker_symbol, stock_data, series, fetched["fundamentals"])
+
+    # Each stage starts once the ones it needs are done, the downloads, the
+    # screenshot and the template all run side by side
+    run(
+        [
+            Stage("logo", lambda: get_logo(ticker_symbol)),
+            Stage(
+                "narration",
+                lambda: default_narration(company, ticker_symbol, today_date),
+            ),
+            Stage("prices", prices),
+            Stage("fundamentals", fundamentals),
+            Stage("charts", charts, ["narration", "prices", "fundamentals"], "cpu"),
+            Stage("screenshot", lambda: get_url(ticker_symbol, url)),
+            Stage("template", lambda: open_template(template_file, ticker_symbol)),
+            Stage("title", lambda: title(company, ticker_symbol), ["template"]),
+            Stage("overview", lambda: overview(company, ticker_symbol), ["template"]),
+            Stage(
+                "headlines",
+                lambda: headlines(company, ticker_symbol),
+                ["template", "charts"],
+            ),
+            Stage("eps", lambda: eps(company, ticker_symbol), ["template", "charts"]),
+            Stage(
+                "images",
+                lambda: replace_images(company, ticker_symbol),
+                ["template", "charts", "screenshot", "logo"],
+            ),
+            Stage(
+                "zip",
+                lambda: zip_ppt(output_file),
+                ["title", "overview", "headlines", "eps", "images"],
+                "cpu",
+            ),
+        ]
+    )
+    return output_file
+
 
-    # Initialize the relatively static narration
-    default_narration(company, ticker_symbol, today_date)
-    # Plot the candlestick chart
-    get_charts(ticker_symbol, five_years, today_date)
-    get_url(ticker_symbol, url)
-
-    # Start with the template
-    open_template("Template2.pptx", ticker_symbol)
-    title(company, ticker_symbol)
-    overview(company, ticker_symbol)
-    headlines(company, ticker_symbol)
-    eps(company, ticker_symbol)
-    replace_images(company, ticker_symbol)
-
-    zip_ppt("temp", f"{ticker_symbol}.pptx")
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("config", nargs="?", default="config.ini")
+    parser.add_argument("--trace", help="write a Chrome trace of the build")
+    parser.add_argument("--profile", help="write cProfile stats of the build")
+    args = parser.parse_args()
+
+    profiling.enabled = bool(args.trace)
+    if args.profile:
+        profiling.start_cprofile()
+    build_deck(read_config_file(args.config))
+    if args.profile:
+        profiling.stop_cprofile(args.profile)
+    if args.trace:
+        profiling.write_chrome_trace(args.trace)
+        profiling.summary()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,103 @@
+from concurrent.futures import ThreadPoolExecutor
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+import profiling
+import render_cache
+
+# PNGs are fitted to the picture they go into before they are put in the
+# deck. The template stretches every image to its slot, so pixels beyond
+# the slot's size at `dpi` are never seen and bigger images are also tried
+# scaled down to exactly that size. The flat black-background charts have
+# few colors and are stored with a palette: exactly when they have at most
+# 256 colors, quantized when `quantize` is set for them. The smallest file,
+# including the one as rendered, goes into the deck. Pillow drops the GIL
+# while it resizes and compresses, so the pictures are done side by side
+# on threads. Results are kept in the render cache, a chart that was
+# copied from there isn't fitted again either.
+
+dpi = 144  # about 1920 pixels across a 16:9 slide
+emu_per_inch = 914400
+workers = None  # defaults to the number of cores
+
+
+def slot_pixels(cx, cy):
+    # a picture's extent in EMUs as pixels at dpi
+    return (
+        max(round(cx * dpi / emu_per_inch), 1),
+        max(round(cy * dpi / emu_per_inch), 1),
+    )
+
+
+def exact_palette(image):
+    # the image in palette mode without changing a pixel, None when it has
+    # more than 256 colors
+    pixels = np.asarray(image, dtype=np.uint32)
+    packed = pixels[..., 0] << 16 | pixels[..., 1] << 8 | pixels[..., 2]
+    colors, indices = np.unique(packed, return_inverse=True)
+    if len(colors) > 256:
+        return None
+    palette = np.stack([colors >> 16, colors >> 8 & 255, colors & 255], axis=1)
+    result = Image.fromarray(indices.reshape(packed.shape).astype(np.uint8), "P")
+    result.putpalette(palette.astype(np.uint8).tobytes())
+    return result
+
+
+def encode(image, quantize):
+    # PNG bytes, with a palette when the image has one or may be quantized
+    if image.mode == "RGB":
+        paletted = exact_palette(image)
+        if paletted is None and quantize:
+            paletted = image.quantize(
+                256, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE
+            )
+        if paletted is not None:
+            image = paletted
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def fit(filename, cx=None, cy=None, quantize=False):
+    # The smallest PNG for filename, as rendered or scaled down to the slot
+    with open(filename, "rb") as file:
+        original = file.read()
+    key = render_cache.digest("fit", original, cx, cy, quantize, dpi)
+    data = render_cache.load(key, filename)
+    if data is None:
+        data = smallest(original, filename, cx, cy, quantize)
+        render_cache.save(key, filename, data)
+    return data
+
+
+def smallest(original, filename, cx, cy, quantize):
+    with profiling.span("fit_picture", file=os.path.basename(filename)):
+        with Image.open(io.BytesIO(original)) as image:
+            image.load()
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA")
+            if image.mode == "RGBA" and image.getextrema()[3][0] == 255:
+                # savefig and Kaleido write an alpha channel even when
+                # every pixel is opaque
+                image = image.convert("RGB")
+
+            candidates = [original, encode(image, quantize)]
+            if cx and cy:
+                # resampling blends the flat colors of a chart into new
+                # ones, so a smaller image isn't always a smaller file
+                size = slot_pixels(cx, cy)
+                if size[0] < image.width or size[1] < image.height:
+                    resized = image.resize(size, Image.Resampling.LANCZOS)
+                    candidates.append(encode(resized, quantize))
+    return min(candidates, key=len)
+
+
+def fit_all(jobs):
+    # jobs: {name: (filename, cx, cy, quantize)} -> {name: PNG bytes}
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        task = profiling.profiled(fit)
+        futures = {name: executor.submit(task, *job) for name, job in jobs.items()}
+        return {name: future.result() for name, future in futures.items()}
@@ -0,0 +1,107 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import time
+
+import profiling
+
+# A deck build as a graph of stages. A stage starts as soon as the stages it
+# depends on are done, so independent work (downloads, the screenshot,
+# opening the template) overlaps and a deck takes as long as its critical
+# path. "io" stages run on asyncio's default thread pool, "cpu" stages on a
+# separate pool sized to the cores so they can't crowd out the waiting I/O.
+# Stages share module state (narration, the open deck), so they all run in
+# this process; the Plotly exports inside a cpu stage fan out to
+# render's process pool on their own.
+
+
+class Stage:
+    def __init__(self, name, fn, deps=(), kind="io"):
+        self.name = name
+        self.fn = fn
+        self.deps = list(deps)
+        self.kind = kind
+
+
+async def run_async(stages, cpu_workers=None):
+    loop = asyncio.get_running_loop()
+    cpu_pool = ThreadPoolExecutor(max_workers=cpu_workers or os.cpu_count())
+    by_name = {stage.name: stage for stage in stages}
+    tasks = {}
+    timings = {}
+    results = {}
+    started = time.perf_counter()
+
+    async def run_stage(stage):
+        await asyncio.gather(*(tasks[dep] for dep in stage.deps))
+        begin = time.perf_counter()
+        fn = profiling.profiled(profiling.timed(f"stage.{stage.name}")(stage.fn))
+        try:
+            if stage.kind == "cpu":
+                result = await loop.run_in_executor(cpu_pool, fn)
+            else:
+                result = await asyncio.to_thread(fn)
+        finally:
+            end = time.perf_counter()
+            timings[stage.name] = (begin - started, end - begin)
+        results[stage.name] = result
+        return result
+
+    def schedule(name, visiting=()):
+        if name in tasks:
+            return
+        if name in visiting:
+            raise ValueError(f"Stage '{name}' depends on itself")
+        stage = by_name[name]
+        for dep in stage.deps:
+            if dep not in by_name:
+                raise ValueError(f"Stage '{name}' depends on unknown '{dep}'")
+            schedule(dep, visiting + (name,))
+        tasks[name] = asyncio.ensure_future(run_stage(stage))
+
+    try:
+        for stage in stages:
+            schedule(stage.name)
+        outcome = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    finally:
+        cpu_pool.shutdown(wait=False)
+
+    errors = [e for e in outcome if isinstance(e, Exception)]
+    report(stages, timings, time.perf_counter() - started)
+    if errors:
+        raise errors[0]
+    return results
+
+
+def run(stages, cpu_workers=None):
+    return asyncio.run(run_async(stages, cpu_workers))
+
+
+def critical_path(stages, timings):
+    # longest chain of stage durations through the dependencies
+    by_name = {stage.name: stage for stage in stages}
+    longest = {}
+
+    def path(name):
+        if name not in longest:
+            chains = [path(dep) for dep in by_name[name].deps]
+            seconds, names = max(chains, key=lambda c: c[0], default=(0.0, []))
+            longest[name] = (seconds + timings[name][1], names + [name])
+        return longest[name]
+
+    # a stage only runs after all of its dependencies did
+    chains = [path(stage.name) for stage in stages if stage.name in timings]
+    return max(chains, key=lambda c: c[0], default=(0.0, []))
+
+
+def report(stages, timings, total):
+    print(f"{'stage':<12} {'start':>8} {'time':>8}")
+    for stage in stages:
+        if stage.name in timings:
+            start, seconds = timings[stage.name]
+            print(f"{stage.name:<12} {start:>7.2f}s {seconds:>7.2f}s")
+        else:
+            print(f"{stage.name:<12} {'-':>8} {'skipped':>8}")
+    length, path = critical_path(stages, timings)
+    print(f"critical path {length:.2f}s: {' -> '.join(path)}")
+    print(f"total {total:.2f}s")
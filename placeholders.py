@@ -0,0 +1,62 @@
+import re
+from xml.sax.saxutils import escape
+
+# Slide XML is split once into literal text and placeholders, so filling in
+# a deck is a single join. A placeholder only counts as a whole token inside
+# a text node: Headline1 doesn't match the start of Headline10, and
+# Company inside a longer word or an attribute is left alone.
+
+names = (
+    ["Company", "Date", "Tagline", "Next_EPS"]
+    + [f"Headline{i}" for i in range(1, 9)]
+    + ["_narration_"]
+)
+
+text_nodes = re.compile(r">([^<]+)<")
+
+
+def token_pattern(tokens):
+    alternatives = "|".join(
+        re.escape(token) for token in sorted(tokens, key=len, reverse=True)
+    )
+    return re.compile(rf"(?<!\w)(?:{alternatives})(?!\w)")
+
+
+default_pattern = token_pattern(names)
+
+
+def parse(content, pattern=default_pattern):
+    # -> (segments, tokens) with len(segments) == len(tokens) + 1, or None
+    # when the XML has no placeholders at all
+    segments = []
+    tokens = []
+    last = 0
+    for node in text_nodes.finditer(content):
+        for match in pattern.finditer(content, node.start(1), node.end(1)):
+            segments.append(content[last : match.start()])
+            tokens.append(match.group())
+            last = match.end()
+    if not tokens:
+        return None
+    segments.append(content[last:])
+    return segments, tokens
+
+
+def fill(parsed, values, part=""):
+    segments, tokens = parsed
+    out = [segments[0]]
+    unfilled = []
+    for token, segment in zip(tokens, segments[1:]):
+        if token in values:
+            out.append(escape(values[token]))
+        else:
+            out.append(token)
+            unfilled.append(token)
+        out.append(segment)
+
+    unknown = sorted(set(values) - set(tokens))
+    if unfilled:
+        print(f"Unfilled placeholders in '{part}': {', '.join(unfilled)}")
+    if unknown:
+        print(f"No placeholder in '{part}' for: {', '.join(unknown)}")
+    return "".join(out)
@@ -0,0 +1,246 @@
+import yfinance as yf
+import pandas as pd
+import numpy as np
+import pickle
+import os
+
+import indicators
+import profiling
+
+# Per-ticker OHLCV store. Each file remembers the [start, end) range it
+# covers so a run only downloads the days that are missing from it, plus
+# the last bar again to notice split and dividend adjustments, and
+# keeps the indicator series with the incremental state that produced them
+# so new bars only advance that state.
+cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache/prices/")
+
+
+def yf_fetch(symbols, start_date, end_date):
+    # one grouped request for the whole list, yfinance threads it internally
+    with profiling.span("yf.download", symbols=len(symbols)):
+        data = yf.download(
+            symbols,
+            start=start_date,
+            end=end_date,
+            group_by="ticker",
+            progress=False,
+            threads=True,
+        )
+    return split_frames(data, symbols)
+
+
+def split_frames(data, symbols):
+    frames = {}
+    for symbol in symbols:
+        if not isinstance(data.columns, pd.MultiIndex):
+            # older yfinance returns flat columns for a single symbol
+            frame = data
+        elif symbol in data.columns.get_level_values(0):
+            frame = data[symbol]
+        else:
+            frame = pd.DataFrame()
+        frames[symbol] = frame.dropna(how="all")
+    return frames
+
+
+# Takes a list of symbols and returns {symbol: frame}. Replace with a local
+# stand-in, e.g. in tests:
+#   price_cache.fetcher = lambda symbols, start, end: {s: frame for s in symbols}
+fetcher = yf_fetch
+
+# Upper bound on the symbols sent in one download request
+group_size = 100
+
+
+def cache_file(ticker_symbol):
+    return cache_dir + f"{ticker_symbol}.pkl"
+
+
+def read_prices(ticker_symbol):
+    filename = cache_file(ticker_symbol)
+    if not os.path.exists(filename):
+        return None
+    try:
+        with open(filename, "rb") as file:
+            return pickle.load(file)
+    except Exception as e:
+        print(f"Ignoring unreadable price cache '{filename}': {e}")
+        return None
+
+
+def write_prices(ticker_symbol, entry):
+    os.makedirs(cache_dir, exist_ok=True)
+    filename = cache_file(ticker_symbol)
+
+    # write then rename so a concurrent reader never sees half a file
+    tmp = f"{filename}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as file:
+        pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, filename)
+
+
+def missing_ranges(entry, start, end):
+    if entry is None:
+        return [(start, end)]
+
+    ranges = []
+    if start < entry["start"]:
+        ranges.append((start, entry["start"]))
+    if end > entry["end"]:
+        # from the last bar held: it comes back again and shows whether the
+        # history has been adjusted for a split or dividend since
+        last = entry["data"].index[-1].normalize()
+        ranges.append((min(last, entry["end"]), end))
+    return ranges
+
+
+def fetch_ranges(wanted):
+    # {(lo, hi): [symbol]} -> {symbol: [(lo, hi, frame)]}, empty frames
+    # dropped
+    fetched = {}
+    for (lo, hi), group in wanted.items():
+        for i in range(0, len(group), group_size):
+            chunk = group[i : i + group_size]
+            frames = fetcher(chunk, lo.date(), hi.date())
+            for symbol in chunk:
+                # unknown and delisted symbols come back empty
+                frame = frames.get(symbol)
+                if frame is not None and not frame.empty:
+                    fetched.setdefault(symbol, []).append((lo, hi, frame))
+    return fetched
+
+
+def adjusted(entry, parts):
+    # True when a bar fetched again closes differently from the cached one.
+    # yfinance prices are adjusted, a split or dividend changes every close
+    # before it.
+    close = entry["data"]["Close"]
+    for _, _, frame in parts:
+        common = frame.index.intersection(close.index)
+        if not np.allclose(
+            frame.loc[common, "Close"], close.loc[common], rtol=1e-6, equal_nan=True
+        ):
+            return True
+    return False
+
+
+def prefetch(symbols, start_date, end_date):
+    start = pd.Timestamp(start_date)
+    end = pd.Timestamp(end_date)
+    entries = {symbol: read_prices(symbol) for symbol in symbols}
+
+    # Symbols refreshed on the same schedule miss the same range, so a whole
+    # universe usually collapses into len(symbols) / group_size requests
+    wanted = {}
+    for symbol, entry in entries.items():
+        for missing in missing_ranges(entry, start, end):
+            wanted.setdefault(missing, []).append(symbol)
+    fetched = fetch_ranges(wanted)
+
+    # An adjusted history is fetched again as a whole. If that fails the
+    # entry is left as it was, so the next run sees the change again.
+    stale = [
+        symbol
+        for symbol, parts in fetched.items()
+        if entries[symbol] is not None and adjusted(entries[symbol], parts)
+    ]
+    if stale:
+        print(f"Price history adjusted since it was cached: {', '.join(stale)}")
+        wanted = {}
+        for symbol in stale:
+            del fetched[symbol]
+            lo = min(start, entries[symbol]["start"])
+            wanted.setdefault((lo, end), []).append(symbol)
+        for symbol, parts in fetch_ranges(wanted).items():
+            fetched[symbol] = parts
+            entries[symbol] = None
+
+    empty = [
+        symbol
+        for symbol, entry in entries.items()
+        if entry is None and symbol not in fetched
+    ]
+    if empty:
+        print(f"No price data for {', '.join(empty)}")
+
+    for symbol, parts in fetched.items():
+        entry = entries[symbol]
+        frames = [frame for _, _, frame in parts]
+        # A range only counts as covered up to the business day after the
+        # last bar that came back, later days are asked for again next time
+        start_covered = min(lo for lo, _, _ in parts)
+        end_covered = max(
+            min(hi, frame.index[-1].normalize() + pd.offsets.BDay())
+            for _, hi, frame in parts
+        )
+        if entry is not None:
+            frames.insert(0, entry["data"])
+            start_covered = min(start_covered, entry["start"])
+            end_covered = max(end_covered, entry["end"])
+
+        data = pd.concat(frames)
+        data = data[~data.index.duplicated(keep="last")].sort_index()
+        updated = {"start": start_covered, "end": end_covered, "data": data}
+        update_indicators(entry, updated)
+        entries[symbol] = updated
+        write_prices(symbol, updated)
+
+    # files written before the indicators were cached
+    for symbol, entry in entries.items():
+        if entry is not None and symbol not in fetched and "series" not in entry:
+            update_indicators(None, entry)
+            write_prices(symbol, entry)
+
+    # symbols without any data are None
+    return entries
+
+
+def update_indicators(previous, entry):
+    close = entry["data"]["Close"].to_numpy(dtype=float)
+
+    # Bars appended after the previous history only advance the saved state,
+    # anything else (older bars added, revised values) recomputes it all
+    if previous is not None and "state" in previous:
+        old = previous["data"]["Close"].to_numpy(dtype=float)
+        index = entry["data"].index
+        if (
+            len(close) >= len(old)
+            and index[: len(old)].equals(previous["data"].index)
+            and np.array_equal(close[: len(old)], old, equal_nan=True)
+        ):
+            entry["series"] = indicators.extend(
+                previous["series"], previous["state"], close[len(old) :]
+            )
+            entry["state"] = previous["state"]
+            return
+
+    entry["series"] = indicators.compute(close)
+    entry["state"] = indicators.build_state(close)
+
+
+def window(entry, start_date, end_date):
+    data = entry["data"]
+    lo = data.index.searchsorted(pd.Timestamp(start_date))
+    hi = data.index.searchsorted(pd.Timestamp(end_date))
+    return lo, hi
+
+
+def cached_entry(ticker_symbol, start_date, end_date):
+    entry = prefetch([ticker_symbol], start_date, end_date)[ticker_symbol]
+    if entry is None:
+        raise ValueError(f"No price data for {ticker_symbol}")
+    return entry
+
+
+def load_prices(ticker_symbol, start_date, end_date):
+    entry = cached_entry(ticker_symbol, start_date, end_date)
+    lo, hi = window(entry, start_date, end_date)
+    return entry["data"].iloc[lo:hi].copy()
+
+
+def load_history(ticker_symbol, start_date, end_date):
+    # prices and their indicator series over the same rows
+    entry = cached_entry(ticker_symbol, start_date, end_date)
+    lo, hi = window(entry, start_date, end_date)
+    series = {name: values[lo:hi] for name, values in entry["series"].items()}
+    return entry["data"].iloc[lo:hi], series
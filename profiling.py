@@ -0,0 +1,219 @@
+from contextlib import contextmanager
+import cProfile
+import functools
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Spans recorded around the expensive steps of a deck build: wall and CPU
+# time, bytes written and the memory each one added. They can be written out
+# as plain JSON or in Chrome's trace format (load it in chrome://tracing or
+# Perfetto) to compare runs. Nothing is kept unless `enabled` is set, e.g. by --trace,
+# so batch and service workers don't collect the spans of every deck.
+
+events = []
+lock = threading.Lock()
+enabled = False
+
+profiler = None
+thread_profilers = []  # see profiled()
+
+# cProfile sees every thread from Python 3.12 on, before that only the
+# thread that enabled it
+per_thread = sys.version_info < (3, 12)
+
+
+def memory():
+    # resident size of the process in bytes, plus the bytes tracemalloc
+    # holds when it is running
+    current = {}
+    try:
+        with open("/proc/self/statm") as file:
+            pages = int(file.read().split()[1])
+        current["rss"] = pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass  # not Linux
+    if tracemalloc.is_tracing():
+        current["traced"] = tracemalloc.get_traced_memory()[0]
+    return current
+
+
+def process_peak():
+    # the most the process was ever resident, not this span's
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def file_size(filename):
+    try:
+        return os.path.getsize(filename)
+    except (OSError, TypeError):
+        return 0
+
+
+def record(
+    name, start, wall, cpu=None, files=(), pid=None, tid=None, memory=None, **args
+):
+    # start is a time.time() timestamp so spans from worker processes line up.
+    # memory is what the span added to the process, from span(). Spans that
+    # overlap on other threads are counted in it too.
+    if not enabled:
+        return
+    event = {
+        "name": name,
+        "start": start,
+        "wall": wall,
+        "cpu": cpu,
+        "bytes": sum(file_size(f) for f in files),
+        "memory": memory or {},
+        "process_peak_rss": process_peak() if pid is None else None,
+        "pid": pid or os.getpid(),
+        "tid": tid or threading.get_ident(),
+        "args": args,
+    }
+    with lock:
+        events.append(event)
+
+
+@contextmanager
+def span(name, files=(), **args):
+    # files are measured once the block is done, for bytes written
+    before = memory() if enabled else {}
+    start = time.time()
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+    try:
+        yield
+    finally:
+        after = memory() if enabled else {}
+        record(
+            name,
+            start,
+            time.perf_counter() - wall,
+            time.thread_time() - cpu,
+            files,
+            memory={f"{k}_delta": after[k] - before[k] for k in after if k in before},
+            **args,
+        )
+
+
+def timed(name=None):
+    def decorator(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(label):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def clear():
+    with lock:
+        events.clear()
+
+
+def write_json(filename):
+    with lock:
+        snapshot = list(events)
+    with open(filename, "w") as file:
+        json.dump(snapshot, file, indent=1)
+
+
+def write_chrome_trace(filename):
+    with lock:
+        snapshot = list(events)
+    trace = []
+    for event in snapshot:
+        args = dict(event["args"])
+        args.update(
+            cpu=event["cpu"],
+            bytes=event["bytes"],
+            process_peak_rss=event["process_peak_rss"],
+            **event["memory"],
+        )
+        trace.append(
+            {
+                "name": event["name"],
+                "ph": "X",
+                "ts": event["start"] * 1e6,
+                "dur": event["wall"] * 1e6,
+                "pid": event["pid"],
+                "tid": event["tid"],
+                "args": args,
+            }
+        )
+    with open(filename, "w") as file:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, file)
+
+
+def summary():
+    with lock:
+        snapshot = list(events)
+    totals = {}
+    for event in snapshot:
+        count, wall, cpu, written = totals.get(event["name"], (0, 0.0, 0.0, 0))
+        totals[event["name"]] = (
+            count + 1,
+            wall + event["wall"],
+            cpu + (event["cpu"] or 0.0),
+            written + event["bytes"],
+        )
+    print(f"{'span':<28} {'count':>5} {'wall':>8} {'cpu':>8} {'bytes':>10}")
+    for name, (count, wall, cpu, written) in sorted(
+        totals.items(), key=lambda item: -item[1][1]
+    ):
+        print(f"{name:<28} {count:>5} {wall:>7.2f}s {cpu:>7.2f}s {written:>10}")
+
+
+def start_cprofile():
+    global profiler
+    profiler = cProfile.Profile()
+    profiler.enable()
+
+
+def profiled(fn):
+    # fn profiled on whatever thread runs it while cProfile is on, the
+    # pipeline stages run on worker threads the main profiler can't see
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if profiler is None or not per_thread:
+            return fn(*args, **kwargs)
+        thread_profiler = cProfile.Profile()
+        try:
+            return thread_profiler.runcall(fn, *args, **kwargs)
+        finally:
+            with lock:
+                thread_profilers.append(thread_profiler)
+
+    return wrapper
+
+
+def stop_cprofile(filename):
+    # view with: python3 -m pstats filename, or snakeviz
+    global profiler
+    if profiler is None:
+        return
+    profiler.disable()
+    stats = pstats.Stats(profiler)
+    with lock:
+        for thread_profiler in thread_profilers:
+            stats.add(thread_profiler)
+        thread_profilers.clear()
+    stats.dump_stats(filename)
+    profiler = None
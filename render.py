@@ -0,0 +1,184 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import util
+import multiprocessing
+import plotly.graph_objects as go
+import plotly.io as pio
+import atexit
+import os
+import time
+
+import profiling
+import render_cache
+
+# Plotly figures queued by the chart functions, exported together so the
+# Kaleido renders run side by side instead of one after another
+jobs = []
+keys = {}  # render cache key of every figure being exported
+workers = None  # defaults to the number of cores
+timeout = 120  # seconds to wait for a deck's charts
+
+# The export pool lives as long as the process, so every worker keeps its
+# renderer warm across charts and tickers
+pool = None
+pool_size = 0
+
+
+def warm_up():
+    # Kaleido >= 1.0 exposes a persistent browser server, older versions
+    # keep their Chromium subprocess alive after the first export. Either
+    # way a test export has to go through: a server whose browser died
+    # hangs every export after it.
+    try:
+        import kaleido
+
+        if hasattr(kaleido, "start_sync_server"):
+            kaleido.start_sync_server()
+    except ImportError:
+        pass
+    pio.to_image(go.Figure(), format="png")
+
+
+def get_pool():
+    global pool, pool_size
+    size = workers or os.cpu_count()
+    if pool is None or pool_size != size:
+        shutdown()
+        # The pool is made by the charts stage, on a pipeline thread, and
+        # again after a renderer died. Forking then could hand the workers
+        # a lock another stage's thread holds, they start from a fork server.
+        pool = ProcessPoolExecutor(
+            max_workers=size,
+            mp_context=multiprocessing.get_context("forkserver"),
+            initializer=warm_up,
+        )
+        pool_size = size
+        # a deck worker of batch.py or service.py exits without running
+        # atexit, multiprocessing's own exit hook shuts its pool down. It
+        # has to run before the hooks closing the pool's queues (10).
+        util.Finalize(pool, pool.shutdown, exitpriority=100)
+    return pool
+
+
+def shutdown():
+    global pool
+    if pool is not None:
+        pool.shutdown()
+        pool = None
+
+
+atexit.register(shutdown)
+
+
+def kill():
+    # A hung renderer never picks up the shutdown, its processes are
+    # stopped instead and the next charts get a new pool
+    global pool
+    if pool is not None:
+        for process in list(pool._processes.values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+        pool = None
+
+
+def result(future, deadline):
+    try:
+        return future.result(timeout=max(0, deadline - time.monotonic()))
+    except TimeoutError:
+        kill()
+        raise TimeoutError(f"the renderers did not answer in {timeout}s")
+
+
+def check():
+    # Waits for a test export on the renderers, raises if they fail or hang
+    executor = get_pool()
+    deadline = time.monotonic() + timeout
+    for future in [executor.submit(warm_up) for _ in range(pool_size)]:
+        result(future, deadline)
+
+
+def queue(fig, filename):
+    # The figure JSON holds its data and all styling, unchanged figures are
+    # copied from the render cache instead of exported
+    key = render_cache.digest(fig.to_json())
+    if render_cache.reuse(filename, key):
+        return
+    keys[os.path.abspath(filename)] = key
+
+    # A plain dict pickles cheaply across to the worker processes
+    jobs.append((filename, fig.to_dict()))
+
+
+def export_batch(batch):
+    # runs in a worker, the timings are recorded by finish() in the parent
+    timings = {}
+    for filename, fig in batch:
+        # a failed export must not leave the last build's chart in place
+        for output, _ in render_cache.outputs(filename):
+            if os.path.exists(output):
+                os.remove(output)
+        start = time.time()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        for output, scale in render_cache.outputs(filename):
+            pio.write_image(fig, output, scale=scale)
+        timings[filename] = (
+            start,
+            time.perf_counter() - wall,
+            time.process_time() - cpu,
+            os.getpid(),
+        )
+    return timings
+
+
+def start():
+    # Hand the queued figures to the pool and return without waiting, so the
+    # caller can get on with the matplotlib tables
+    batch = [(os.path.abspath(filename), fig) for filename, fig in jobs]
+    jobs.clear()
+    if not batch:
+        return []
+
+    # one batch per warm worker rather than one task per figure
+    executor = get_pool()
+    batches = [batch[i::pool_size] for i in range(min(pool_size, len(batch)))]
+    return [(executor.submit(export_batch, b), [f for f, _ in b]) for b in batches]
+
+
+def finish(pending):
+    # Waits for every export, then raises the first error if any failed
+    timings = {}
+    errors = []
+    deadline = time.monotonic() + timeout
+    for future, filenames in pending:
+        try:
+            timings.update(result(future, deadline))
+        except Exception as e:
+            print(f"An error occurred rendering charts: {e}")
+            errors.append(e)
+            if isinstance(e, BrokenProcessPool):
+                # a renderer died, the next charts get a new pool
+                shutdown()
+            for filename in filenames:
+                keys.pop(filename, None)
+
+    for filename, (start, seconds, cpu, pid) in timings.items():
+        print(f"Rendered {os.path.relpath(filename)} in {seconds:.2f}s")
+        profiling.record(
+            "write_image",
+            start,
+            seconds,
+            cpu,
+            [filename],
+            pid=pid,
+            tid=pid,
+            file=os.path.basename(filename),
+        )
+        render_cache.store(filename, keys.pop(filename))
+    if errors:
+        raise errors[0]
+    return {filename: timing[1] for filename, timing in timings.items()}
+
+
+def render_all():
+    return finish(start())
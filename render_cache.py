@@ -0,0 +1,171 @@
+import pandas as pd
+import hashlib
+import os
+import shutil
+import threading
+
+# Rendered charts stored under a hash of everything that went into them
+# (data, styling, size), so a chart whose inputs didn't change since the last
+# build is copied instead of rendered. Least recently used images are evicted
+# once the cache grows past max_bytes.
+cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache/renders/")
+max_bytes = 500 * 1024 * 1024
+# The PNG fallback of an SVG chart is only drawn by viewers without SVG
+# support, it is rendered at this fraction of the chart's size
+fallback_scale = 0.5
+
+hits = 0
+misses = 0  # of the current deck, see reset_stats()
+size = None  # bytes in the cache, scanned on the first store of a deck
+size_lock = threading.Lock()
+
+
+def digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, pd.DataFrame):
+            h.update(repr(list(part.columns)).encode())
+            try:
+                hashed = pd.util.hash_pandas_object(part, index=True)
+                h.update(hashed.to_numpy().tobytes())
+            except TypeError:
+                # columns holding lists or dicts can't be hashed directly
+                h.update(part.to_json(date_format="iso").encode())
+        elif isinstance(part, bytes):
+            h.update(part)
+        else:
+            h.update(repr(part).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def cache_file(key, filename, scale=1):
+    suffix = "" if scale == 1 else f"@{scale}x"
+    return cache_dir + key + suffix + os.path.splitext(filename)[1]
+
+
+def outputs(filename):
+    # [(file, scale)] a chart is rendered to. An SVG chart also gets a small
+    # PNG of itself, the deck's fallback for viewers that can't draw SVG.
+    root, ext = os.path.splitext(filename)
+    if ext == ".svg":
+        return [(filename, 1), (root + ".png", fallback_scale)]
+    return [(filename, 1)]
+
+
+def reuse(filename, key):
+    # Copy a cached render to filename, False if there is none
+    global hits, misses
+    try:
+        for output, scale in outputs(filename):
+            cached = cache_file(key, output, scale)
+            shutil.copyfile(cached, output)
+            os.utime(cached)  # most recently used
+    except OSError:
+        misses += 1
+        return False
+    hits += 1
+    return True
+
+
+def store(filename, key):
+    os.makedirs(cache_dir, exist_ok=True)
+    for output, scale in outputs(filename):
+        cached = cache_file(key, output, scale)
+        tmp = f"{cached}.{os.getpid()}.tmp"
+        try:
+            shutil.copyfile(output, tmp)
+            os.replace(tmp, cached)
+            nbytes = os.path.getsize(output)
+        except OSError as e:
+            print(f"Could not cache {output}: {e}")
+            return
+        added(nbytes)
+
+
+def load(key, filename):
+    # bytes cached for key, None if there are none
+    cached = cache_file(key, filename)
+    try:
+        with open(cached, "rb") as file:
+            data = file.read()
+        os.utime(cached)
+    except OSError:
+        return None
+    return data
+
+
+def save(key, filename, data):
+    os.makedirs(cache_dir, exist_ok=True)
+    cached = cache_file(key, filename)
+    tmp = f"{cached}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "wb") as file:
+            file.write(data)
+        os.replace(tmp, cached)
+    except OSError as e:
+        print(f"Could not cache {filename}: {e}")
+        return
+    added(len(data))
+
+
+def added(nbytes):
+    # Evicts only when the running total passes max_bytes, instead of
+    # scanning the directory after every file. Other processes' files are
+    # counted when a deck starts over with a fresh scan.
+    global size
+    with size_lock:
+        if size is None:
+            size = scan_size()
+        size += nbytes
+        if size > max_bytes:
+            size = evict()
+
+
+def scan_size():
+    total = 0
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.name.endswith(".tmp"):
+                continue
+            try:
+                total += entry.stat().st_size
+            except OSError:
+                pass  # evicted by another process
+    return total
+
+
+def evict():
+    # Removes the least recently used files down to 80% of max_bytes, so
+    # the next scan is a while away, returns the bytes left
+    entries = []
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.name.endswith(".tmp"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue  # evicted by another thread or process
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(nbytes for _, nbytes, _ in entries)
+    for _, nbytes, path in sorted(entries):
+        if total <= max_bytes * 0.8:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # another process got there first
+        total -= nbytes
+    return total
+
+
+def stats():
+    return {"hits": hits, "misses": misses}
+
+
+def reset_stats():
+    global hits, misses, size
+    hits = misses = 0
+    size = None
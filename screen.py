@@ -1,18 +1,259 @@
+from concurrent.futures import ThreadPoolExecutor
 from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
+from multiprocessing import util
+from PIL import Image
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+import profiling
+
+# Browser settings for every capture
+window_width = 1280
+window_height = 800
+page_load_timeout = 30  # seconds, the screenshot is taken either way
+pool_size = 2
+
+# Homepages rarely change in ways that matter, a capture is reused until it
+# is older than screenshot_ttl. When a fresh capture looks the same as the
+# old one (perceptual hashes within phash_distance bits) the old image is
+# kept so the deck doesn't change for nothing. None skips that check.
+screen_cache_dir = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "cache/screens/"
+)
+screenshot_ttl = 7 * 24 * 60 * 60  # seconds
+phash_distance = 6
+
+
+def chrome_driver():
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    options.add_argument(f"--window-size={window_width},{window_height}")
+    options.add_argument("--hide-scrollbars")
+    driver = webdriver.Chrome(options=options)
+    driver.set_page_load_timeout(page_load_timeout)
+    return driver
+
+
+class StubDriver:
+    # Stands in for webdriver.Chrome so captures can be tested offline. It
+    # records the pages it was sent to and saves a blank screenshot.
+    def __init__(self):
+        self.visited = []
+        self.closed = False
+
+    def set_page_load_timeout(self, seconds):
+        pass
+
+    def get(self, url):
+        self.visited.append(url)
+
+    def save_screenshot(self, filename):
+        Image.new("RGB", (window_width, window_height), "white").save(filename)
+        return True
+
+    def quit(self):
+        self.closed = True
+
+
+class BrowserPool:
+    # Browsers are started on first use and kept for the next capture, so
+    # the startup cost is paid once per browser instead of once per page
+    def __init__(self, size=pool_size, driver_factory=chrome_driver):
+        self.size = size
+        self.driver_factory = driver_factory
+        self.idle = []
+        self.started = 0
+        # waiters are woken by a browser coming back and by one being
+        # dropped, which frees a slot to start a new browser in
+        self.changed = threading.Condition()
+
+    def acquire(self):
+        with self.changed:
+            while not self.idle and self.started >= self.size:
+                self.changed.wait()
+            if self.idle:
+                return self.idle.pop()
+            self.started += 1
+        try:
+            return self.driver_factory()
+        except Exception:
+            self.dropped()
+            raise
+
+    def dropped(self):
+        with self.changed:
+            self.started -= 1
+            self.changed.notify()
+
+    def release(self, driver, broken=False):
+        if broken:
+            # don't hand a browser in an unknown state to the next capture
+            try:
+                driver.quit()
+            finally:
+                self.dropped()
+            return
+        with self.changed:
+            self.idle.append(driver)
+            self.changed.notify()
+
+    def capture(self, ticker_symbol, url):
+        filename = f"{ticker_symbol}/homepage.png"
+        driver = self.acquire()
+        broken = False
+        try:
+            with profiling.span("screenshot", files=[filename], url=url):
+                try:
+                    driver.get(url)
+                except TimeoutException:
+                    print(f"{url} did not finish loading in {page_load_timeout}s")
+                driver.save_screenshot(filename)
+        except Exception:
+            broken = True
+            raise
+        finally:
+            self.release(driver, broken)
+        return filename
+
+    def capture_many(self, targets):
+        # targets: [(ticker_symbol, url)] -> {ticker_symbol: filename or error}
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            futures = {
+                executor.submit(self.capture, ticker_symbol, url): ticker_symbol
+                for ticker_symbol, url in targets
+            }
+            for future, ticker_symbol in futures.items():
+                try:
+                    results[ticker_symbol] = future.result()
+                except Exception as e:
+                    print(f"Could not capture {ticker_symbol}: {e}")
+                    results[ticker_symbol] = e
+        return results
+
+    def close(self):
+        with self.changed:
+            drivers, self.idle = self.idle, []
+        for driver in drivers:
+            try:
+                driver.quit()
+            finally:
+                self.dropped()
+
+
+browsers = None
+
+
+def get_pool():
+    global browsers
+    if browsers is None:
+        browsers = BrowserPool()
+        # atexit doesn't run in the deck workers of batch.py and service.py,
+        # multiprocessing's exit hook does, in the main process as well
+        util.Finalize(browsers, browsers.close, exitpriority=100)
+    return browsers
+
+
+def perceptual_hash(filename):
+    # difference hash: brighter/darker between neighbours on a 9x8 thumbnail
+    with Image.open(filename) as img:
+        pixels = list(img.convert("L").resize((9, 8)).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            bits = bits << 1 | (left > right)
+    return bits
+
+
+def cached_screenshot(url):
+    # one image and one metadata file per url, so concurrent workers never
+    # write the same file
+    name = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    return screen_cache_dir + name + ".png", screen_cache_dir + name + ".json"
+
+
+def reuse_screenshot(url, filename):
+    image, meta = cached_screenshot(url)
+    try:
+        with open(meta) as file:
+            captured = json.load(file)["captured"]
+        if time.time() - captured > screenshot_ttl:
+            return False
+        shutil.copyfile(image, filename)
+    except (OSError, ValueError, KeyError):
+        return False
+    return True
+
+
+def store_screenshot(url, filename):
+    os.makedirs(screen_cache_dir, exist_ok=True)
+    image, meta = cached_screenshot(url)
+
+    new_hash = perceptual_hash(filename) if phash_distance is not None else None
+    old_hash = None
+    try:
+        with open(meta) as file:
+            old_hash = json.load(file).get("hash")
+    except (OSError, ValueError):
+        pass
+
+    if (
+        new_hash is not None
+        and old_hash is not None
+        and os.path.exists(image)
+        and bin(new_hash ^ old_hash).count("1") <= phash_distance
+    ):
+        # looks the same, keep the previous image
+        shutil.copyfile(image, filename)
+        new_hash = old_hash
+    else:
+        tmp = f"{image}.{os.getpid()}.tmp"
+        shutil.copyfile(filename, tmp)
+        os.replace(tmp, image)
+
+    tmp = f"{meta}.{os.getpid()}.tmp"
+    with open(tmp, "w") as file:
+        json.dump({"url": url, "captured": time.time(), "hash": new_hash}, file)
+    os.replace(tmp, meta)
 
 
 def get_url(ticker_symbol, url):
-    # Create a new instance of the Chrome webdriver
-    driver = webdriver.Chrome()
+    # Reuse a recent capture, otherwise take a screenshot with one of the
+    # pooled browsers
+    filename = f"{ticker_symbol}/homepage.png"
+    if reuse_screenshot(url, filename):
+        return filename
+    get_pool().capture(ticker_symbol, url)
+    store_screenshot(url, filename)
+    return filename
 
-    # Open the web page
-    driver.get(url)
 
-    # Capture a screenshot and save it as a PNG file
-    driver.save_screenshot(f"{ticker_symbol}/homepage.png")
+def get_urls(targets):
+    # get_url for many [(ticker_symbol, url)], the stale ones captured
+    # concurrently
+    results = {}
+    stale = []
+    for ticker_symbol, url in targets:
+        filename = f"{ticker_symbol}/homepage.png"
+        if reuse_screenshot(url, filename):
+            results[ticker_symbol] = filename
+        else:
+            stale.append((ticker_symbol, url))
 
-    # Close the browser
-    driver.quit()
+    captured = get_pool().capture_many(stale)
+    for ticker_symbol, url in stale:
+        result = captured[ticker_symbol]
+        if not isinstance(result, Exception):
+            store_screenshot(url, result)
+        results[ticker_symbol] = result
+    return results
 
 
 def main():
@@ -0,0 +1,292 @@
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+
+import batch
+import deck
+import render
+import screen
+
+# A resident deck builder. The imports (yfinance, pandas, plotly,
+# matplotlib, selenium), the parsed template, the chart renderers and a
+# browser are set up once and then reused, so a deck only costs its own
+# work. Decks are built by a pool of worker processes, each in its own
+# directory the way batch.py does it:
+#
+#   python3 service.py [--port 8765] [--workers 2]
+#   curl -d '{"ticker": "AAPL", "company": "Apple", "url": "https://www.apple.com",
+#             "tagline": "Think Different", "logo": "/path/to/logo.png"}' \
+#        http://127.0.0.1:8765/decks
+#
+# The answer is {"path": ".../decks/AAPL.pptx"}, or the deck itself when
+# the request sends "Accept: application/vnd.openxmlformats-officedocument.
+# presentationml.presentation". It only listens on localhost, logo is a
+# path on this machine.
+
+host = "127.0.0.1"
+port = 8765
+workers = 2  # decks built at the same time
+max_queue = 16  # decks building or waiting before requests are turned away
+
+required = ["ticker", "company", "url", "tagline", "logo"]
+optional = ["format"]
+# the ticker names the work directory, so it can't be only dots or hold ".."
+valid_ticker = re.compile(r"^(?!\.*$)(?!.*\.\.)[A-Za-z0-9.^=-]{1,20}$")
+pptx_type = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+
+executor = None
+executor_lock = threading.Lock()
+template_file = None
+out_dir = None
+work_root = None
+deck_workers = workers
+render_workers = 1
+
+queued = 0  # decks building or waiting
+queued_lock = threading.Lock()
+
+# Two builds of one ticker would share a work directory and output file
+ticker_locks = {}
+ticker_locks_lock = threading.Lock()
+
+
+def warm_up(renderers):
+    # Runs once in every worker process. The modules and the template came
+    # with the fork, the renderers and a browser are started here instead
+    # of by the first deck.
+    render.workers = renderers
+    try:
+        render.check()
+    except Exception as e:
+        # a broken pool is dropped, the first deck makes a new one
+        print(f"Could not start the chart renderers yet: {e}")
+        render.shutdown()
+    try:
+        browsers = screen.get_pool()
+        browsers.release(browsers.acquire())
+    except Exception as e:
+        print(f"Could not start a browser yet: {e}")
+
+
+def start(template="Template2.pptx", size=None):
+    global executor, template_file, out_dir, work_root, deck_workers, render_workers
+    template_file = os.path.abspath(template)
+    out_dir = os.path.abspath(batch.output_dir)
+    work_root = os.path.abspath(batch.batch_dir)
+    os.makedirs(out_dir, exist_ok=True)
+
+    # parsed before the workers fork so they share it
+    deck.load_template(template_file)
+
+    deck_workers = size or workers
+    render_workers = max(1, os.cpu_count() // deck_workers)
+    executor = ProcessPoolExecutor(
+        max_workers=deck_workers, initializer=warm_up, initargs=(render_workers,)
+    )
+
+    # The pool forks its workers as tasks come in. Forking from a request
+    # thread could hand a worker a lock another thread holds, so they are
+    # all started now, while this is the only thread.
+    wait([executor.submit(time.sleep, 0.1) for _ in range(deck_workers)])
+
+
+def replace_executor(broken):
+    # A worker died (a browser or Kaleido crash, the OOM killer) and the
+    # pool can't be used again. Its replacement starts its workers from a
+    # fork server: forking from this request thread could hand them locks
+    # other threads hold. They import the modules and parse the template
+    # themselves, which is fine for something that should rarely happen.
+    global executor
+    with executor_lock:
+        if executor is not broken:
+            return  # another request replaced it already
+        print("A deck worker died, starting new ones")
+        broken.shutdown(wait=False, cancel_futures=True)
+        executor = ProcessPoolExecutor(
+            max_workers=deck_workers,
+            mp_context=multiprocessing.get_context("forkserver"),
+            initializer=warm_up,
+            initargs=(render_workers,),
+        )
+
+
+def stop():
+    global executor
+    if executor is not None:
+        executor.shutdown(cancel_futures=True)
+        executor = None
+
+
+def reserve():
+    # a place in the queue, False when it is full
+    global queued
+    with queued_lock:
+        if queued >= max_queue:
+            return False
+        queued += 1
+        return True
+
+
+def release():
+    global queued
+    with queued_lock:
+        queued -= 1
+
+
+def ticker_lock(ticker_symbol):
+    with ticker_locks_lock:
+        return ticker_locks.setdefault(ticker_symbol, threading.Lock())
+
+
+def settings_from(request):
+    # the deck settings from a request body, ValueError when it isn't usable
+    if not isinstance(request, dict):
+        raise ValueError("Expected a JSON object")
+    missing = [key for key in required if not request.get(key)]
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)}")
+    settings = {
+        key: str(request[key]) for key in required + optional if request.get(key)
+    }
+    if not valid_ticker.match(settings["ticker"]):
+        raise ValueError(f"Not a ticker symbol: {settings['ticker']}")
+    # "aapl" and "AAPL" share a work directory on case-insensitive file
+    # systems, and so have to share a lock
+    settings["ticker"] = settings["ticker"].upper()
+    settings["logo"] = os.path.abspath(settings["logo"])
+    if not os.path.isfile(settings["logo"]):
+        raise ValueError(f"No logo at {settings['logo']}")
+    return settings
+
+
+def build(settings, read=False):
+    # Blocks until the deck is built, returns its path and, with read, its
+    # bytes. They are read under the lock: once it is released another build
+    # of the ticker can replace the file.
+    with ticker_lock(settings["ticker"]):
+        pool = executor
+        try:
+            future = pool.submit(
+                batch.build_one,
+                settings,
+                template_file,
+                out_dir,
+                render_workers,
+                work_root,
+            )
+            path = future.result()
+            if not read:
+                return path, None
+            with open(path, "rb") as file:
+                return path, file.read()
+        except BrokenProcessPool:
+            replace_executor(pool)
+            raise
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/health":
+            self.send_json(404, {"error": "Not found"})
+            return
+        self.send_json(
+            200, {"workers": deck_workers, "queued": queued, "max_queue": max_queue}
+        )
+
+    def do_POST(self):
+        if self.path != "/decks":
+            self.send_json(404, {"error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            settings = settings_from(json.loads(self.rfile.read(length) or b"null"))
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+            return
+
+        if not reserve():
+            self.send_json(
+                503, {"error": "Too many decks queued"}, {"Retry-After": "30"}
+            )
+            return
+        try:
+            started = time.perf_counter()
+            wants_file = pptx_type in self.headers.get("Accept", "")
+            path, data = build(settings, wants_file)
+            seconds = time.perf_counter() - started
+        except BrokenProcessPool:
+            print(f"{settings['ticker']}: failed - a deck worker died")
+            self.send_json(
+                503, {"error": "A deck worker died, try again"}, {"Retry-After": "5"}
+            )
+            return
+        except Exception as e:
+            print(f"{settings['ticker']}: failed - {e}")
+            self.send_json(500, {"error": str(e)})
+            return
+        finally:
+            release()
+
+        print(f"{settings['ticker']}: {path} in {seconds:.2f}s")
+        if wants_file:
+            self.send_file(path, data)
+        else:
+            self.send_json(200, {"path": path, "seconds": round(seconds, 3)})
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_file(self, path, data):
+        self.send_response(200)
+        self.send_header("Content-Type", pptx_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header(
+            "Content-Disposition", f'attachment; filename="{os.path.basename(path)}"'
+        )
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def serve(bind_port=None):
+    server = ThreadingHTTPServer((host, bind_port or port), Handler)
+    server.daemon_threads = True
+    print(f"Building decks on http://{host}:{server.server_port}/decks")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        stop()
+
+
+def main():
+    global max_queue
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=port)
+    parser.add_argument("--workers", type=int, default=workers)
+    parser.add_argument("--max-queue", type=int, default=max_queue)
+    parser.add_argument("--template", default="Template2.pptx")
+    args = parser.parse_args()
+
+    max_queue = args.max_queue
+    start(args.template, args.workers)
+    serve(args.port)
+
+
+if __name__ == "__main__":
+    main()
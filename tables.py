@@ -0,0 +1,111 @@
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import matplotlib
+import threading
+
+import numpy as np
+
+import profiling
+import render_cache
+
+# The matplotlib charts of the deck (tables and the insider bars) are drawn
+# on Figures with their own Agg canvas, never through pyplot, so nothing
+# registers them globally and no GUI backend is touched. Every thread keeps
+# one figure per size and clears it for the next chart, which keeps memory
+# flat over a batch of thousands of tickers. Colors are set on the artists
+# instead of the global rcParams so one chart can't change the next.
+
+local = threading.local()
+
+
+def figure(size, background):
+    figures = getattr(local, "figures", None)
+    if figures is None:
+        figures = local.figures = {}
+    fig = figures.get(size)
+    if fig is None:
+        fig = Figure(figsize=size)
+        FigureCanvasAgg(fig)
+        figures[size] = fig
+    fig.set_facecolor(background)
+    fig.set_edgecolor(background)
+    return fig
+
+
+def save(fig, filename, **kwargs):
+    # the format follows the file name, SVGs keep their text as text and
+    # come with a small PNG fallback
+    files = render_cache.outputs(filename)
+    dpi = kwargs.pop("dpi", fig.dpi)
+    try:
+        with profiling.span("savefig", files=[output for output, _ in files]):
+            with matplotlib.rc_context({"svg.fonttype": "none"}):
+                for output, scale in files:
+                    fig.savefig(output, dpi=dpi * scale, **kwargs)
+    finally:
+        # drop the artists now, the figure itself is reused
+        fig.clear()
+
+
+def cell_colors(shape, background, columns=None):
+    # background everywhere, columns maps a column number to its colors
+    colors = np.full(shape, background, dtype=object)
+    for col, values in (columns or {}).items():
+        colors[:, col] = values
+    return colors
+
+
+def table(filename, text, labels, size, background, textcolor, colors=None):
+    # text and colors are (rows, columns) arrays, highlighted cells (any
+    # color but the background) get their text in the background color
+    text = np.asarray(text, dtype=object)
+    if colors is None:
+        colors = cell_colors(text.shape, background)
+    text_colors = np.where(colors == background, textcolor, background)
+
+    fig = figure(size, background)
+    ax = fig.add_subplot(111, frame_on=False)
+    ax.xaxis.set_visible(False)
+    ax.yaxis.set_visible(False)
+
+    cells = ax.table(
+        cellText=text.tolist(),
+        colLabels=labels,
+        cellLoc="center",
+        loc="center",
+        colColours=[background] * len(labels),
+        cellColours=colors.tolist(),
+    )
+    for (row, col), cell in cells.get_celld().items():
+        # row 0 is the header
+        color = textcolor if row == 0 else text_colors[row - 1, col]
+        cell.get_text().set_color(color)
+
+    save(fig, filename, bbox_inches="tight", pad_inches=0.05)
+
+
+def bars(
+    filename,
+    x,
+    heights,
+    title,
+    xlabel,
+    ylabel,
+    size,
+    background,
+    textcolor,
+    color="fuchsia",
+    width=4.0,
+):
+    fig = figure(size, background)
+    ax = fig.add_subplot(1, 1, 1)
+    ax.set_facecolor(background)
+
+    ax.bar(x, heights, color=color, width=width)
+
+    ax.set_title(title, color=textcolor)
+    ax.set_xlabel(xlabel, color=textcolor)
+    ax.set_ylabel(ylabel, color=textcolor)
+    ax.grid(True)
+
+    save(fig, filename)
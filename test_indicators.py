@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import indicators
+import price_cache
+
+talib = pytest.importorskip("talib")
+
+# Both the vectorized and the incremental series have to match what the
+# charts were drawn with before: pandas rolling windows for the moving
+# averages and Bollinger bands, talib for RSI and MACD.
+rtol = 1e-9
+atol = 1e-9
+
+
+def closes(days=1250, seed=0):
+    return 100 + np.cumsum(np.random.default_rng(seed).normal(0, 1, days))
+
+
+def reference(close):
+    history = pd.Series(close)
+    ma20 = history.rolling(20).mean()
+    std20 = history.rolling(20).std()
+    expected = {
+        "ma20": ma20,
+        "ma50": history.rolling(50).mean(),
+        "ma200": history.rolling(200).mean(),
+        "upper": ma20 + std20 * 2,
+        "lower": ma20 - std20 * 2,
+        "rsi": talib.RSI(close, timeperiod=14),
+    }
+    expected["macd"], expected["signal"], expected["hist"] = talib.MACD(
+        close, fastperiod=12, slowperiod=26, signalperiod=9
+    )
+    return {name: np.asarray(values, dtype=float) for name, values in expected.items()}
+
+
+def assert_series(series, expected, names=None):
+    for name in names or expected:
+        np.testing.assert_allclose(
+            series[name], expected[name], rtol=rtol, atol=atol, err_msg=name
+        )
+
+
+def prices(close, start="2020-01-01"):
+    index = pd.bdate_range(start, periods=len(close))
+    return pd.DataFrame({"Close": close}, index=index)
+
+
+def test_compute_matches_pandas_and_talib():
+    close = closes()
+    assert_series(indicators.compute(close), reference(close))
+
+
+def test_compute_short_history():
+    close = closes(30)
+    assert_series(indicators.compute(close), reference(close))
+
+
+def test_compute_frames_matches_compute():
+    frames = {f"T{i}": prices(closes(300 + 50 * (i % 2), seed=i)) for i in range(4)}
+    results = indicators.compute_frames(frames)
+    for ticker_symbol, data in frames.items():
+        close = data["Close"].to_numpy()
+        assert_series(results[ticker_symbol], indicators.compute(close))
+
+
+def test_extend_one_bar_at_a_time():
+    close = closes()
+    series = indicators.compute(close[:1000])
+    state = indicators.build_state(close[:1000])
+    for value in close[1000:]:
+        series = indicators.extend(series, state, [value])
+    assert_series(series, reference(close))
+
+
+def test_extend_in_chunks():
+    close = closes()
+    series = indicators.compute(close[:300])
+    state = indicators.build_state(close[:300])
+    for lo in range(300, len(close), 137):
+        series = indicators.extend(series, state, close[lo : lo + 137])
+    assert_series(series, reference(close))
+
+
+def test_missing_closes():
+    # a gap only blanks the windows that hold it, as with pandas
+    close = closes()
+    close[[100, 400, 401, 900]] = np.nan
+    expected = reference(close)
+    series = indicators.compute(close)
+    assert_series(series, expected, ["ma20", "ma50", "ma200", "upper", "lower"])
+    assert np.isnan(series["ma50"]).sum() == 200
+
+    state = indicators.build_state(close[:50])
+    extended = indicators.compute(close[:50])
+    extended = indicators.extend(extended, state, close[50:])
+    assert_series(extended, series)
+
+
+def test_update_indicators_appends():
+    close = closes()
+    previous = {"data": prices(close[:1000])}
+    price_cache.update_indicators(None, previous)
+    entry = {"data": prices(close)}
+    price_cache.update_indicators(previous, entry)
+
+    # the saved state was advanced, not rebuilt
+    assert entry["state"] is previous["state"]
+    assert entry["state"].count == len(close)
+    assert_series(entry["series"], reference(close))
+
+
+def test_update_indicators_recomputes_prepended_history():
+    close = closes()
+    data = prices(close)
+    previous = {"data": data.iloc[250:]}
+    price_cache.update_indicators(None, previous)
+    entry = {"data": data}
+    price_cache.update_indicators(previous, entry)
+
+    assert entry["state"] is not previous["state"]
+    assert_series(entry["series"], reference(close))
+
+
+def test_update_indicators_recomputes_revised_closes():
+    # a split or dividend adjusts every close before it
+    close = closes()
+    previous = {"data": prices(close[:1000] * 2)}
+    price_cache.update_indicators(None, previous)
+    entry = {"data": prices(close)}
+    price_cache.update_indicators(previous, entry)
+
+    assert entry["state"] is not previous["state"]
+    assert_series(entry["series"], reference(close))
+
+    # and the rebuilt state keeps advancing correctly
+    more = closes(1300)
+    more[:1250] = close
+    series = indicators.extend(entry["series"], entry["state"], more[1250:])
+    assert_series(series, reference(more))
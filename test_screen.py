@@ -0,0 +1,79 @@
+import threading
+
+import pytest
+
+import screen
+
+
+class FailingDriver(screen.StubDriver):
+    # blocks on a page until told to go on, then fails like a crashed browser
+    def __init__(self, go_on):
+        super().__init__()
+        self.go_on = go_on
+
+    def get(self, url):
+        self.go_on.wait()
+        raise RuntimeError("browser crashed")
+
+
+def test_capture_reuses_browsers(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "A").mkdir()
+    drivers = []
+
+    def factory():
+        drivers.append(screen.StubDriver())
+        return drivers[-1]
+
+    pool = screen.BrowserPool(1, factory)
+    pool.capture("A", "https://a.example")
+    pool.capture("A", "https://b.example")
+    assert len(drivers) == 1
+    assert drivers[0].visited == ["https://a.example", "https://b.example"]
+    assert (tmp_path / "A" / "homepage.png").exists()
+
+    pool.close()
+    assert drivers[0].closed
+    assert pool.started == 0
+
+
+def test_waiter_starts_a_browser_when_the_busy_one_breaks(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "B").mkdir()
+    go_on = threading.Event()
+    drivers = [FailingDriver(go_on), screen.StubDriver()]
+    pool = screen.BrowserPool(1, lambda: drivers.pop(0))
+    results = {}
+
+    def capture(ticker_symbol):
+        try:
+            results[ticker_symbol] = pool.capture(ticker_symbol, "https://example")
+        except Exception as e:
+            results[ticker_symbol] = e
+
+    first = threading.Thread(target=capture, args=("A",), daemon=True)
+    first.start()
+    second = threading.Thread(target=capture, args=("B",), daemon=True)
+    second.start()
+    # the second capture waits for the only browser, which then breaks
+    second.join(0.2)
+    assert second.is_alive()
+    go_on.set()
+
+    first.join(5)
+    second.join(5)
+    assert not first.is_alive() and not second.is_alive()
+    assert isinstance(results["A"], RuntimeError)
+    assert results["B"] == "B/homepage.png"
+    assert pool.started == 1
+
+
+def test_failed_start_frees_its_slot():
+    def factory():
+        raise RuntimeError("no browser")
+
+    pool = screen.BrowserPool(1, factory)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            pool.acquire()
+    assert pool.started == 0
@@ -3,10 +3,19 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from datetime import datetime, timedelta
 from dateutil import relativedelta
-import talib
 import pandas as pd
-import matplotlib.pyplot as plt
+import numpy as np
 import os
+from types import SimpleNamespace
+
+import decimate
+import fundamentals
+import indicators
+import price_cache
+import profiling
+import render
+import render_cache
+import tables
 
 narration = {}  # narration slide type
 
@@ -14,42 +23,66 @@ narration = {}  # narration slide type
 background = "black"
 textcolor = "white"
 
+# "png", or "svg" for vector charts, which are smaller and quicker to
+# export, see Deck.write_svg for how they go into the deck
+image_format = "png"
 
-# Plot the 50 and 200 day moving averages
-def moving_averages(ticker_symbol, days, data):
-    fig = go.Figure()
 
-    # Plot 50-day moving average
-    fifty = data["Close"].rolling(window=50).mean()
-    fig.add_trace(
-        go.Scatter(
-            x=data.tail(days).index,
-            y=fifty.tail(days),  # data["Close"].rolling(window=50).mean(),
-            mode="lines",
-            name="50-day MA",
-        )
-    )
+def chart_file(ticker_symbol, name):
+    return f"{ticker_symbol}/{name}.{image_format}"
 
-    # Plot 200-day moving average
-    fig.add_trace(
-        go.Scatter(
-            x=data.tail(days).index,
-            y=data["Close"].rolling(window=200).mean().tail(days),
-            mode="lines",
-            name="200-day MA",
-        )
-    )
 
-    # Plot stock prices
-    fig.add_trace(
-        go.Scatter(
-            x=data.tail(days).index,
-            y=data["Close"].tail(days),
-            mode="lines",
-            name="Stock Price",
-        )
+def chart_window(stock_data, series, days=None):
+    # The last `days` rows as numpy views onto the shared history, so every
+    # chart slices once and nothing is copied or written back to the frame.
+    # prev_close is the close before the window, nan if there is none.
+    start = 0 if days is None else max(len(stock_data) - days, 0)
+    close = stock_data["Close"].to_numpy()
+    return SimpleNamespace(
+        x=stock_data.index[start:],
+        open=stock_data["Open"].to_numpy()[start:],
+        high=stock_data["High"].to_numpy()[start:],
+        low=stock_data["Low"].to_numpy()[start:],
+        close=close[start:],
+        volume=stock_data["Volume"].to_numpy()[start:],
+        prev_close=close[start - 1] if start > 0 else float("nan"),
+        series={name: values[start:] for name, values in series.items()},
     )
 
+
+def up_down_colors(close, reference, up="chartreuse", down="red"):
+    # one comparison over the whole array instead of a lookup per bar
+    return np.where(close >= reference, up, down)
+
+
+def volume_colors(window):
+    # Each bar against the close before it. The first bar of the window is
+    # compared with the bar before the window, or with its own open if the
+    # window starts at the beginning of the history.
+    previous = np.empty(len(window.close))
+    previous[1:] = window.close[:-1]
+    if len(previous):
+        previous[0] = window.prev_close
+        if np.isnan(previous[0]):
+            previous[0] = window.open[0]
+    return up_down_colors(window.close, previous)
+
+
+# Plot the 50 and 200 day moving averages
+@profiling.timed()
+def moving_averages(ticker_symbol, days, window):
+    fig = go.Figure()
+
+    # Each line thinned to what the image can show, see decimate
+    lines = [
+        (window.series["ma50"], "50-day MA"),  # Plot 50-day moving average
+        (window.series["ma200"], "200-day MA"),  # Plot 200-day moving average
+        (window.close, "Stock Price"),  # Plot stock prices
+    ]
+    for values, name in lines:
+        x, y = decimate.line(window.x, values)
+        fig.add_trace(go.Scatter(x=x, y=y, mode="lines", name=name))
+
     fig.update_layout(
         title=f"{ticker_symbol} 50 & 200 Day Moving Averages",
         xaxis_title="Date",
@@ -60,25 +93,20 @@ def moving_averages(ticker_symbol, days, data):
     )
 
     # Save the chart
-    filename = f"{ticker_symbol}/{days}_ma.png"
-    fig.write_image(filename)  # fig.show()
-
-
-def calculate_rsi(data):
-    # Calculate RSI
-    data["rsi"] = talib.RSI(data["Close"], timeperiod=14)
-    return data
+    filename = chart_file(ticker_symbol, f"{days}_ma")
+    render.queue(fig, filename)  # fig.show()
 
 
-def rsi(ticker_symbol, days, stock_data):
-    data = calculate_rsi(data=stock_data)
+@profiling.timed()
+def rsi(ticker_symbol, days, window):
     fig = go.Figure()
 
     # Plot RSI
+    x, y = decimate.line(window.x, window.series["rsi"])
     fig.add_trace(
         go.Scatter(
-            x=data.tail(days).index,
-            y=data["rsi"].tail(days),
+            x=x,
+            y=y,
             mode="lines",
             name="RSI",
             line=dict(color="cyan"),
@@ -89,8 +117,8 @@ def rsi(ticker_symbol, days, stock_data):
     fig.add_shape(
         dict(
             type="line",
-            x0=data.tail(days).index.min(),
-            x1=data.tail(days).index.max(),
+            x0=window.x[0],
+            x1=window.x[-1],
             y0=70,
             y1=70,
             line=dict(color="fuchsia"),
@@ -100,8 +128,8 @@ def rsi(ticker_symbol, days, stock_data):
     fig.add_shape(
         dict(
             type="line",
-            x0=data.tail(days).index.min(),
-            x1=data.tail(days).index.max(),
+            x0=window.x[0],
+            x1=window.x[-1],
             y0=30,
             y1=30,
             line=dict(color="chartreuse"),
@@ -118,37 +146,30 @@ def rsi(ticker_symbol, days, stock_data):
     )
 
     # Save the chart
-    filename = f"{ticker_symbol}/{days}_rsi.png"
-    fig.write_image(filename)  # fig.show()
-
-
-def calculate_macd(stock_data):
-    # Calculate MACD
-    stock_data["macd"], stock_data["signal"], _ = talib.MACD(
-        stock_data["Close"], fastperiod=12, slowperiod=26, signalperiod=9
-    )
-    return stock_data
+    filename = chart_file(ticker_symbol, f"{days}_rsi")
+    render.queue(fig, filename)  # fig.show()
 
 
-def macd(ticker_symbol, days, stock_data):
-    data = calculate_macd(stock_data)
-
+@profiling.timed()
+def macd(ticker_symbol, days, window):
     fig = go.Figure()
 
     # Plot MACD and Signal lines
+    x, y = decimate.line(window.x, window.series["macd"])
     fig.add_trace(
         go.Scatter(
-            x=data.tail(days).index,
-            y=data["macd"].tail(days),
+            x=x,
+            y=y,
             mode="lines",
             name="MACD",
             line=dict(color="chartreuse"),
         )
     )
+    x, y = decimate.line(window.x, window.series["signal"])
     fig.add_trace(
         go.Scatter(
-            x=data.tail(days).index,
-            y=data["signal"].tail(days),
+            x=x,
+            y=y,
             mode="lines",
             name="Signal",
             line=dict(color="fuchsia"),
@@ -158,8 +179,8 @@ def macd(ticker_symbol, days, stock_data):
     # Plot histogram for MACD
     fig.add_trace(
         go.Bar(
-            x=data.tail(days).index,
-            y=data["macd"].tail(days) - data["signal"].tail(days),
+            x=window.x,
+            y=window.series["hist"],
             name="MACD Histogram",
             marker=dict(color="blue"),
         )
@@ -175,19 +196,16 @@ def macd(ticker_symbol, days, stock_data):
     )
 
     # Save the chart
-    filename = f"{ticker_symbol}/{days}_macd.png"
-    fig.write_image(filename)  # fig.show()
+    filename = chart_file(ticker_symbol, f"{days}_macd")
+    render.queue(fig, filename)  # fig.show()
 
 
-def bollinger_candle(ticker_symbol, days, stock_data, window_size=20, num_std_dev=2):
-    # Calculate moving average and standard deviation
-    stock_data["MA"] = stock_data["Close"].rolling(window=window_size).mean()
-    stock_data["Upper"] = stock_data["MA"] + (
-        stock_data["Close"].rolling(window=window_size).std() * num_std_dev
-    )
-    stock_data["Lower"] = stock_data["MA"] - (
-        stock_data["Close"].rolling(window=window_size).std() * num_std_dev
-    )
+@profiling.timed()
+def bollinger_candle(ticker_symbol, days, window):
+    # Moving average and bands come precomputed from indicators, see
+    # indicators.bollinger_window and indicators.num_std_dev
+    window = decimate.bars(window)
+
     # Create subplots and mention plot grid size
     fig = make_subplots(
         rows=2,
@@ -202,35 +220,35 @@ def bollinger_candle(ticker_symbol, days, stock_data, window_size=20, num_std_de
     fig.add_traces(
         [
             go.Candlestick(
-                x=stock_data.tail(days).index,
-                open=stock_data["Open"].tail(days),
-                high=stock_data["High"].tail(days),
-                low=stock_data["Low"].tail(days),
-                close=stock_data["Close"].tail(days),
+                x=window.x,
+                open=window.open,
+                high=window.high,
+                low=window.low,
+                close=window.close,
                 name="Candlesticks",
                 showlegend=False,
                 increasing=dict(line=dict(color="chartreuse")),
                 decreasing=dict(line=dict(color="red")),
             ),
             go.Scatter(
-                x=stock_data.tail(days).index,
-                y=stock_data["Upper"].tail(days),
+                x=window.x,
+                y=window.series["upper"],
                 mode="lines",
                 line=dict(color="fuchsia"),
                 name="Upper Band",
                 showlegend=False,
             ),
             go.Scatter(
-                x=stock_data.tail(days).index,
-                y=stock_data["MA"].tail(days),
+                x=window.x,
+                y=window.series[f"ma{indicators.bollinger_window}"],
                 mode="lines",
                 line=dict(color=textcolor),
                 name="Moving Average",
                 showlegend=False,
             ),
             go.Scatter(
-                x=stock_data.tail(days).index,
-                y=stock_data["Lower"].tail(days),
+                x=window.x,
+                y=window.series["lower"],
                 mode="lines",
                 line=dict(color="greenyellow"),
                 name="Lower Band",
@@ -242,21 +260,13 @@ def bollinger_candle(ticker_symbol, days, stock_data, window_size=20, num_std_de
     )
 
     # Color volume bars based on up or down day
-    subset = stock_data.tail(days)
-    colors = [
-        (
-            "chartreuse"
-            if subset["Close"].iloc[i] >= subset["Close"].iloc[i - 1]
-            else "red"
-        )
-        for i in range(1, len(subset))
-    ]
+    colors = volume_colors(window)
 
     # Volume bar trace
     fig.add_trace(
         go.Bar(
-            x=stock_data.tail(days).index[1:],
-            y=stock_data.tail(days)["Volume"][1:],
+            x=window.x,
+            y=window.volume,
             marker_color=colors,
             name="Volume",
             showlegend=False,
@@ -277,11 +287,15 @@ def bollinger_candle(ticker_symbol, days, stock_data, window_size=20, num_std_de
     )
 
     # Save the chart
-    filename = f"{ticker_symbol}/{days}_bollinger.png"
-    fig.write_image(filename)
+    filename = chart_file(ticker_symbol, f"{days}_bollinger")
+    render.queue(fig, filename)
 
 
-def candle(ticker_symbol, period, stock_data):
+@profiling.timed()
+def candle(ticker_symbol, period, window):
+    # 5 years of daily candles are merged into weekly ones, see decimate
+    window = decimate.bars(window)
+
     # Create subplots and mention plot grid size
     fig = make_subplots(
         rows=2,
@@ -294,11 +308,11 @@ def candle(ticker_symbol, period, stock_data):
 
     fig.add_trace(
         go.Candlestick(
-            x=stock_data.index,
-            open=stock_data["Open"],
-            high=stock_data["High"],
-            low=stock_data["Low"],
-            close=stock_data["Close"],
+            x=window.x,
+            open=window.open,
+            high=window.high,
+            low=window.low,
+            close=window.close,
             showlegend=False,
             increasing=dict(line=dict(color="chartreuse")),
             decreasing=dict(line=dict(color="red")),
@@ -307,14 +321,7 @@ def candle(ticker_symbol, period, stock_data):
         col=1,
     )
     # Color volume bars based on up or down day
-    colors = [
-        (
-            "chartreuse"
-            if stock_data["Close"].iloc[i] >= stock_data["Close"].iloc[i - 1]
-            else "red"
-        )
-        for i in range(1, len(stock_data))
-    ]
+    colors = volume_colors(window)
 
     fig.update_layout(
         paper_bgcolor=background,
@@ -325,8 +332,8 @@ def candle(ticker_symbol, period, stock_data):
     # Volume bar trace
     fig.add_trace(
         go.Bar(
-            x=stock_data.index[1:],
-            y=stock_data["Volume"][1:],
+            x=window.x,
+            y=window.volume,
             marker_color=colors,
             name="Volume",
             showlegend=False,
@@ -344,24 +351,23 @@ def candle(ticker_symbol, period, stock_data):
     )
 
     # Save the chart
-    filename = ticker_symbol + "/" + period + "_candle.png"
-    fig.write_image(filename)  # fig.show()
+    filename = chart_file(ticker_symbol, f"{period}_candle")
+    render.queue(fig, filename)  # fig.show()
 
 
 def volume(ticker_symbol, period, stock_data):
     fig = go.Figure()
 
     # Color volume bars based on up or down day
-    colors = [
-        "green" if stock_data["Close"].iloc[i] >= stock_data["Open"].iloc[i] else "red"
-        for i in range(1, len(stock_data))
-    ]
+    colors = up_down_colors(
+        stock_data["Close"].to_numpy(), stock_data["Open"].to_numpy(), up="green"
+    )
 
     # Volume bar trace
     fig.add_trace(
         go.Bar(
-            x=stock_data.index[1:],
-            y=stock_data["Volume"][1:],
+            x=stock_data.index,
+            y=stock_data["Volume"],
             marker_color=colors,
             name="Volume",
         )
@@ -382,6 +388,7 @@ def volume(ticker_symbol, period, stock_data):
     return fig
 
 
+@profiling.timed()
 def news(ticker_symbol, yf_stock):
     news = yf_stock.news
     headlines = ""
@@ -398,39 +405,34 @@ def news(ticker_symbol, yf_stock):
     narration["Headlines"] = headlines
 
 
+@profiling.timed()
 def plot_dataframe(ticker_symbol, df, x_column, y_column, title="Graph"):
-    plt.rcParams["text.color"] = textcolor
+    filename = chart_file(ticker_symbol, "insider")
+    key = render_cache.digest(
+        "plot_dataframe", df, x_column, y_column, title, background, textcolor
+    )
+    if render_cache.reuse(filename, key):
+        return
 
     # Convert the 'date' column to datetime if it's not already
-    if pd.api.types.is_datetime64_any_dtype(df[x_column]):
-        df[x_column] = pd.to_datetime(df[x_column])
+    if not pd.api.types.is_datetime64_any_dtype(df[x_column]):
+        df = df.assign(**{x_column: pd.to_datetime(df[x_column])})
 
     # Sort the DataFrame by the 'date' column
     df = df.sort_values(by=x_column)
 
-    # Create a bar chart
-    fig, ax = plt.subplots()
-    fig = plt.figure(figsize=(10, 6))
-    ax = fig.add_subplot(1, 1, 1)
-
-    # Set background color
-    fig.patch.set_facecolor(background)
-    ax.set_facecolor(background)
-
-    ax.bar(df[x_column], df[y_column].div(1000), color="fuchsia", width=4.0)
-
-    ax.xaxis.label.set_color(textcolor)
-    ax.yaxis.label.set_color(textcolor)
-
-    # Customize the plot
-    plt.title(title)
-    plt.xlabel("Past 90 Days")
-    plt.ylabel("Shares(1000s)")
-    plt.grid(True)
-
-    # Save the chart
-    filename = ticker_symbol + "/insider.png"
-    plt.savefig(filename)
+    tables.bars(
+        filename,
+        df[x_column],
+        df[y_column].div(1000),
+        title,
+        "Past 90 Days",
+        "Shares(1000s)",
+        (10, 6),
+        background,
+        textcolor,
+    )
+    render_cache.store(filename, key)
 
 
 # https://pypi.org/project/yfinance/
@@ -449,79 +451,45 @@ def insider(ticker_symbol, yf_stock):
     )
 
 
+@profiling.timed()
 def up_downgrades(ticker_symbol, yf_stock):
     df = yf_stock.upgrades_downgrades
     cell_color = background
     head_rows = df.head(12)  # df could be very long we only want the latest
-    plt.rcParams["text.color"] = textcolor
-    plt.figure(figsize=(6, 3.0))
-    fig = plt.gcf()
-
-    # Set the background color
-    fig.set_facecolor(background)
-    fig.set_edgecolor(background)
-
-    ax = plt.subplot(111, frame_on=False)
-    ax.xaxis.set_visible(False)
-    ax.yaxis.set_visible(False)
-
-    table_data = []
-    cell_colors = []
-    for i, (index, row) in enumerate(head_rows.iterrows()):
-        if row["Action"] == "down":
-            action_color = "red"
-        elif row["Action"] == "up":
-            action_color = "#7fff7f"  # "green"
-        else:
-            action_color = cell_color
-
-        if row["ToGrade"] == "Sell":
-            grade_color = "red"
-        elif row["ToGrade"] == "Outperform":
-            grade_color = "#7fff7f"  # "green"
-        elif row["ToGrade"] == "Underweight":
-            grade_color = "yellow"
-        else:
-            grade_color = cell_color
-        cell_colors.append(
-            [cell_color, cell_color, grade_color, cell_color, action_color]
-        )
-
-        table_data.append(
-            [
-                index.strftime("%Y-%m-%d"),
-                row["Firm"],
-                row["ToGrade"],
-                row["FromGrade"],
-                row["Action"],
-            ]
-        )
+    filename = chart_file(ticker_symbol, "up_down")
+    key = render_cache.digest("up_downgrades", head_rows, background, textcolor)
+    if render_cache.reuse(filename, key):
+        return
+
+    action = head_rows["Action"]
+    grade = head_rows["ToGrade"]
+    colors = tables.cell_colors(
+        (len(head_rows), 5),
+        cell_color,
+        {
+            2: np.select(
+                [grade == "Sell", grade == "Outperform", grade == "Underweight"],
+                ["red", "#7fff7f", "yellow"],  # "green"
+                cell_color,
+            ),
+            4: np.select(
+                [action == "down", action == "up"], ["red", "#7fff7f"], cell_color
+            ),
+        },
+    )
+    text = np.column_stack(
+        [
+            head_rows.index.strftime("%Y-%m-%d"),
+            head_rows["Firm"],
+            grade,
+            head_rows["FromGrade"],
+            action,
+        ]
+    )
 
     colLabels = ["Date", "Firm", "New Grade", "Prev Grade", "Action"]
-    table = plt.table(
-        cellText=table_data,
-        colLabels=colLabels,  # head_rows.columns,
-        cellLoc="center",
-        loc="center",
-        colColours=[cell_color] * len(colLabels),
-        # cellColours=[["#f0f0f0", "#f0f0f0", "#f0f0f0", "#f0f0f0", "#f0f0f0"]]
-        cellColours=cell_colors,
-        # colWidth=[0.2, 0.2, 0.2, 0.2],
-    )
-
-    for i, cell in enumerate(table.get_celld().values()):
-        c = i % len(colLabels)
-        r = int(i / len(colLabels))
-        if r >= len(cell_colors):
-            break
-        colors = cell_colors[r]
-        if colors[c] != background:
-            # highlighted cell
-            cell.set_text_props(color=background)  # fontweight="bold",
-        else:
-            cell.set_text_props(color=textcolor)
-
-    plt.savefig(f"{ticker_symbol}/up_down.png", bbox_inches="tight", pad_inches=0.05)
+    tables.table(filename, text, colLabels, (6, 3.0), background, textcolor, colors)
+    render_cache.store(filename, key)
 
 
 # msft.recommendations
@@ -546,51 +514,25 @@ def get_month(delta):
     return month_name
 
 
+@profiling.timed()
 def recommendations(ticker_symbol, yf_stock):
     df = yf_stock.recommendations  # same as recommendations_summary?
-    plt.rcParams["text.color"] = textcolor
-    plt.figure(figsize=(6, 1.5))
-    fig = plt.gcf()
-
-    # Set the background color
-    fig.set_facecolor(background)
-
-    ax = plt.subplot(111, frame_on=False)
-    ax.xaxis.set_visible(False)
-    ax.yaxis.set_visible(False)
+    filename = chart_file(ticker_symbol, "recommendations")
+    # the month names depend on today's date
+    month = datetime.now().strftime("%Y-%m")
+    key = render_cache.digest("recommendations", df, month, background, textcolor)
+    if render_cache.reuse(filename, key):
+        return
 
     # modify the period to show the month
-    df["when"] = df["period"].apply(get_month)
-
-    table_data = []
-    for i, (index, row) in enumerate(df.iterrows()):
-        table_data.append(
-            [
-                row["when"],
-                row["strongBuy"],
-                row["buy"],
-                row["hold"],
-                row["sell"],
-                row["strongSell"],
-            ]
-        )
-
-    colLabels = ["When", "Strong Buy", "Buy", "Hold", "Sell", "Strong Sell"]
-    table = plt.table(
-        cellText=table_data,
-        colLabels=colLabels,  # head_rows.columns,
-        cellLoc="center",
-        loc="center",
-        colColours=[background] * len(colLabels),
-        cellColours=[
-            [background, background, background, background, background, background]
-        ]
-        * len(df),
+    columns = ["strongBuy", "buy", "hold", "sell", "strongSell"]
+    text = np.column_stack(
+        [df["period"].map(get_month)] + [df[c].astype(str) for c in columns]
     )
 
-    plt.savefig(
-        f"{ticker_symbol}/recommendations.png", bbox_inches="tight", pad_inches=0.05
-    )
+    colLabels = ["When", "Strong Buy", "Buy", "Hold", "Sell", "Strong Sell"]
+    tables.table(filename, text, colLabels, (6, 1.5), background, textcolor)
+    render_cache.store(filename, key)
 
 
 def format_date_with_suffix(date):
@@ -618,18 +560,9 @@ def dollars_to_words(val):
     return rv
 
 
+@profiling.timed()
 def earnings(ticker_symbol, yf_stock):
     df = yf_stock.earnings_dates
-    plt.rcParams["text.color"] = textcolor
-    plt.figure(figsize=(6, 2.3))
-    fig = plt.gcf()
-
-    # Set the background color
-    fig.set_facecolor(background)
-
-    ax = plt.subplot(111, frame_on=False)
-    ax.xaxis.set_visible(False)
-    ax.yaxis.set_visible(False)
 
     # remove future EPS dates that have Reported = NaN
     # find the first row with an Estimate
@@ -642,50 +575,38 @@ def earnings(ticker_symbol, yf_stock):
     narration["EPS"] = (
         f"Next earnings will report on {earnings_day} with a current estimate of {estimate}. "
     )
+
+    # the narration above is still needed when the table is cached
+    filename = chart_file(ticker_symbol, "earnings")
+    key = render_cache.digest("earnings", df, background, textcolor)
+    if render_cache.reuse(filename, key):
+        return
+
     df_rows = df.dropna(subset=["Reported EPS"])
-    table_data = []
-    cell_colors = []
-    for i, (index, row) in enumerate(df_rows.iterrows()):
-        if row["Surprise(%)"] < -0.01:
-            surprise_color = "fuchsia"
-        elif row["Surprise(%)"] > 0.1:
-            surprise_color = "chartreuse"
-        else:
-            surprise_color = background
-
-        row["Surprise(%)"] = row["Surprise(%)"].round(5)
-        cell_colors.append([background, background, background, surprise_color])
-        table_data.append(
-            [
-                index.strftime("%Y-%m-%d"),
-                row["EPS Estimate"],
-                row["Reported EPS"],
-                row["Surprise(%)"],
-            ]
-        )
+    surprise = df_rows["Surprise(%)"]
+    colors = tables.cell_colors(
+        (len(df_rows), 4),
+        background,
+        {
+            3: np.select(
+                [surprise < -0.01, surprise > 0.1],
+                ["fuchsia", "chartreuse"],
+                background,
+            )
+        },
+    )
+    text = np.column_stack(
+        [
+            df_rows.index.strftime("%Y-%m-%d"),
+            df_rows["EPS Estimate"].astype(str),
+            df_rows["Reported EPS"].astype(str),
+            surprise.round(5).astype(str),
+        ]
+    )
 
     colLabels = ["Date", "Estimate", "Reported", "Surprise(%)"]
-    table = plt.table(
-        cellText=table_data,
-        colLabels=colLabels,
-        cellLoc="center",
-        loc="center",
-        colColours=[background] * len(colLabels),
-        cellColours=cell_colors,
-    )
-    for i, cell in enumerate(table.get_celld().values()):
-        c = i % len(colLabels)
-        r = int(i / len(colLabels))
-        if r >= len(cell_colors):
-            break
-        colors = cell_colors[r]
-        if colors[c] != background:
-            # highlighted cell
-            cell.set_text_props(color=background)  # fontweight="bold",
-        else:
-            cell.set_text_props(color=textcolor)
-
-    plt.savefig(f"{ticker_symbol}/earnings.png", bbox_inches="tight", pad_inches=0.05)
+    tables.table(filename, text, colLabels, (6, 2.3), background, textcolor, colors)
+    render_cache.store(filename, key)
 
 
 def options(ticker_symbol, yf_stock):
@@ -696,39 +617,86 @@ def default_narration(company, ticker_symbol, today_date):
     narration["summary"] = (
         "So is it time to buy or hold or sell {company}?\nPause:0.75\nOr maybe just run away?"
     )
+    # earnings() and news() replace these, they stay when the earnings
+    # dates or the news couldn't be fetched
+    narration["next_EPS"] = ""
+    narration["EPS"] = "There is no date for the next earnings report yet. "
+    narration["Headlines"] = "There are no headlines for now.\nPause:0.5\n"
+
+
+def get_prices(ticker_symbol, start_date, end_date):
+    # Historical stock data and its indicators, only the missing tail is
+    # downloaded and computed
+    return price_cache.load_history(ticker_symbol, start_date, end_date)
 
 
-def get_charts(ticker_symbol, start_date, end_date):
+def get_fundamentals(ticker_symbol):
+    # earnings, recommendations, upgrades, insider and news fetched at once
+    return fundamentals.prefetch(yf.Ticker(ticker_symbol))
+
+
+def draw_charts(ticker_symbol, stock_data, series, yf_stock):
+    # Everything here works on data already in memory
     os.makedirs(ticker_symbol, exist_ok=True)
-    yf_stock = yf.Ticker(ticker_symbol)
+    render_cache.reset_stats()
 
-    # Fetch historical stock data
-    stock_data = yf.download(ticker_symbol, start=start_date, end=end_date)
+    # One windowed view per chart, 90 days is shared by four of them
+    five_year = chart_window(stock_data, series)
+    ninety = chart_window(stock_data, series, 90)
 
     # Candle 5 year
-    candle(ticker_symbol=ticker_symbol, period="5 Year", stock_data=stock_data)
-    moving_averages(ticker_symbol=ticker_symbol, days=365, data=stock_data)
+    candle(ticker_symbol=ticker_symbol, period="5 Year", window=five_year)
+    moving_averages(
+        ticker_symbol=ticker_symbol,
+        days=365,
+        window=chart_window(stock_data, series, 365),
+    )
 
     # Candle 90 days
-    ninety = stock_data.tail(90).copy()
-    candle(ticker_symbol=ticker_symbol, period="90 Day", stock_data=ninety)
-    rsi(ticker_symbol=ticker_symbol, days=90, stock_data=stock_data)
-    macd(ticker_symbol=ticker_symbol, days=90, stock_data=stock_data)
+    candle(ticker_symbol=ticker_symbol, period="90 Day", window=ninety)
+    rsi(ticker_symbol=ticker_symbol, days=90, window=ninety)
+    macd(ticker_symbol=ticker_symbol, days=90, window=ninety)
 
     # Bollinger & Candle 90 days
-    bollinger_candle(ticker_symbol=ticker_symbol, days=90, stock_data=stock_data)
+    bollinger_candle(ticker_symbol=ticker_symbol, days=90, window=ninety)
 
     # Candle 5 days
-    # TODO - missing first day of volume because its color is based on prev day
-    five_day = stock_data.tail(5)
-    candle(ticker_symbol=ticker_symbol, period="5 Day", stock_data=five_day)
+    five_day = chart_window(stock_data, series, 5)
+    candle(ticker_symbol=ticker_symbol, period="5 Day", window=five_day)
+
+    # Export the Plotly charts in the background while the tables are drawn
+    pending = render.start()
 
     # options(ticker_symbol, yf_stock)
-    earnings(ticker_symbol, yf_stock)
-    recommendations(ticker_symbol, yf_stock)
-    up_downgrades(ticker_symbol, yf_stock)
-    insider(ticker_symbol, yf_stock)
-    news(ticker_symbol, yf_stock)
+    fundamental_charts = [
+        (earnings, "earnings_dates"),
+        (recommendations, "recommendations"),
+        (up_downgrades, "upgrades_downgrades"),
+        (insider, "insider_transactions"),
+        (news, "news"),
+    ]
+    for chart, attribute in fundamental_charts:
+        if getattr(yf_stock, attribute) is None:
+            print(f"Skipping {chart.__name__}, no {attribute} for {ticker_symbol}")
+            continue
+        chart(ticker_symbol, yf_stock)
+
+    render.finish(pending)
+    cache = render_cache.stats()
+    print(f"Render cache: {cache['hits']} hits, {cache['misses']} misses")
+
+
+def get_charts(ticker_symbol, start_date, end_date, stock_data=None):
+    os.makedirs(ticker_symbol, exist_ok=True)
+    yf_stock = get_fundamentals(ticker_symbol)
+
+    # A batch can pass in a frame it already split out of a bulk download
+    if stock_data is None:
+        stock_data, series = get_prices(ticker_symbol, start_date, end_date)
+    else:
+        series = indicators.compute(stock_data["Close"].to_numpy(dtype=float))
+
+    draw_charts(ticker_symbol, stock_data, series, yf_stock)
 
 
 def main():